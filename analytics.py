@@ -0,0 +1,110 @@
+# analytics.py
+"""Загрузка и выручка отеля по дням: occupancy, ADR и RevPAR.
+
+Брони периода читаются одним запросом (даты и стоимость), а по ночам
+раскладываются разностными массивами: +1 номер и +выручка за ночь
+в день заезда, -1 и -выручка в день выезда, накопленная сумма даёт
+проданные номера и выручку каждой ночи. Время расчёта зависит
+от числа броней и дней периода, но не от длины проживаний.
+
+Стоимость брони делится по её ночам поровну; ночи за пределами
+периода отбрасываются.
+"""
+from datetime import date
+from fastapi import HTTPException, Query
+from models import Booking, Room
+from availability import INACTIVE_STATUSES
+
+ANALYTICS_MAX_DAYS = 731
+
+
+class AnalyticsParams:
+    """Период отчёта [from, to): to — день после последней ночи"""
+
+    def __init__(self,
+                 first: date = Query(..., alias='from'),
+                 last: date = Query(..., alias='to')):
+        if last <= first:
+            raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+        if (last - first).days > ANALYTICS_MAX_DAYS:
+            raise HTTPException(status_code=400, detail=f"Period is longer than {ANALYTICS_MAX_DAYS} days")
+        self.first = first
+        self.last = last
+
+
+def hotel_bookings(hotel_id, first, last):
+    """Даты и стоимость броней отеля, занимающих хотя бы одну ночь периода"""
+    return (Booking
+            .select(Booking.check_in_date, Booking.check_out_date, Booking.total_price)
+            .join(Room)
+            .where((Room.hotel == hotel_id) &
+                   (Booking.check_in_date < last) &
+                   (Booking.check_out_date > first) &
+                   (Booking.status.not_in(INACTIVE_STATUSES)))
+            .tuples())
+
+
+def nightly_totals(bookings, first, last):
+    """Проданные номера и выручка по ночам [first, last) одним векторным проходом"""
+    import numpy as np
+    first = np.datetime64(first, 'D')
+    days = int((np.datetime64(last, 'D') - first).astype(np.int64))
+    rows = list(bookings)
+    if not rows:
+        return np.zeros(days, dtype=np.int64), np.zeros(days)
+    check_ins, check_outs, prices = zip(*rows)
+    start = (np.asarray(check_ins, dtype='datetime64[D]') - first).astype(np.int64)
+    end = (np.asarray(check_outs, dtype='datetime64[D]') - first).astype(np.int64)
+    nights = np.maximum(end - start, 1)
+    rates = np.asarray([price or 0.0 for price in prices], dtype=float) / nights
+    # Индекс days — выезд после конца периода, он отбрасывается
+    start = np.clip(start, 0, days)
+    end = np.clip(end, 0, days)
+    sold = np.bincount(start, minlength=days + 1) - np.bincount(end, minlength=days + 1)
+    revenue = (np.bincount(start, weights=rates, minlength=days + 1)
+               - np.bincount(end, weights=rates, minlength=days + 1))
+    return np.cumsum(sold)[:days], np.cumsum(revenue)[:days]
+
+
+def hotel_analytics(hotel_id, first, last):
+    """Отчёт по дням и итог за период"""
+    import numpy as np
+    rooms = Room.select().where(Room.hotel == hotel_id).count()
+    sold, revenue = nightly_totals(hotel_bookings(hotel_id, first, last), first, last)
+    revenue = np.round(revenue, 2)
+    dates = np.arange(np.datetime64(first, 'D'), np.datetime64(last, 'D')).astype(str)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        occupancy = np.round(sold / rooms, 4) if rooms else np.zeros(len(sold))
+        revpar = np.round(revenue / rooms, 2) if rooms else np.zeros(len(sold))
+        adr = np.round(revenue / sold, 2)
+
+    def or_none(values, mask):
+        return [value if present else None for value, present in zip(values.tolist(), mask.tolist())]
+
+    total_sold = int(sold.sum())
+    total_revenue = round(float(revenue.sum()), 2)
+    available = rooms * len(sold)
+    return {
+        'hotel_id': hotel_id,
+        'from': first.isoformat(),
+        'to': last.isoformat(),
+        'rooms': rooms,
+        'summary': {
+            'room_nights_available': available,
+            'room_nights_sold': total_sold,
+            'revenue': total_revenue,
+            'occupancy': round(total_sold / available, 4) if available else 0.0,
+            'adr': round(total_revenue / total_sold, 2) if total_sold else None,
+            'revpar': round(total_revenue / available, 2) if available else 0.0,
+        },
+        'days': [{
+            'date': day,
+            'rooms_sold': rooms_sold,
+            'revenue': day_revenue,
+            'occupancy': day_occupancy,
+            'adr': day_adr,
+            'revpar': day_revpar,
+        } for day, rooms_sold, day_revenue, day_occupancy, day_adr, day_revpar in zip(
+            dates.tolist(), sold.tolist(), revenue.tolist(), occupancy.tolist(),
+            or_none(adr, sold > 0), revpar.tolist())],
+    }
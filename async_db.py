@@ -0,0 +1,142 @@
+# async_db.py
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from database import (DB_ENGINE, DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT,
+                      DB_POOL_SIZE, DB_POOL_OVERFLOW)
+import query_stats
+
+
+class AsyncConnection:
+    """Соединение асинхронного драйвера, выполняющее запросы peewee.
+
+    peewee используется только для построения SQL: query.sql() возвращает
+    текст и параметры в стиле плейсхолдеров текущей базы (%s для MySQL,
+    ? для SQLite), который совпадает со стилем aiomysql и aiosqlite.
+    """
+
+    def __init__(self, raw, engine):
+        self.raw = raw
+        self.engine = engine
+
+    async def _execute(self, query):
+        sql, params = query.sql() if not isinstance(query, str) else (query, ())
+        start = time.perf_counter()
+        try:
+            if self.engine == 'sqlite':
+                cursor = await self.raw.execute(sql, params)
+            else:
+                cursor = await self.raw.cursor()
+                await cursor.execute(sql, params)
+        finally:
+            query_stats.record(time.perf_counter() - start)
+        return cursor
+
+    async def fetch_all(self, query):
+        """Все строки запроса в виде словарей"""
+        cursor = await self._execute(query)
+        try:
+            rows = await cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+        finally:
+            await cursor.close()
+        return [dict(zip(columns, row)) for row in rows]
+
+    async def fetch_one(self, query):
+        rows = await self.fetch_all(query)
+        return rows[0] if rows else None
+
+    async def execute(self, query):
+        """Выполнить изменяющий запрос и вернуть id вставленной строки"""
+        cursor = await self._execute(query)
+        try:
+            return cursor.lastrowid
+        finally:
+            await cursor.close()
+
+
+class AsyncDatabase:
+    """Пул соединений асинхронного драйвера: aiomysql или aiosqlite"""
+
+    def __init__(self, engine=DB_ENGINE):
+        self.engine = engine
+        self._pool = None
+        self._lock = asyncio.Lock()
+
+    async def _connect_sqlite(self):
+        import aiosqlite
+        # Транзакциями управляем явно, поэтому автокоммит
+        raw = await aiosqlite.connect(DB_NAME, isolation_level=None)
+        await raw.execute('PRAGMA journal_mode=wal')
+        await raw.execute('PRAGMA busy_timeout=5000')
+        return raw
+
+    async def _open(self):
+        if self.engine == 'sqlite':
+            # У aiosqlite нет своего пула: держим очередь готовых соединений
+            self._pool = asyncio.Queue()
+            for _ in range(DB_POOL_SIZE):
+                self._pool.put_nowait(await self._connect_sqlite())
+        else:
+            import aiomysql
+            self._pool = await aiomysql.create_pool(
+                host=DB_HOST, port=DB_PORT, user=DB_USER, password=DB_PASSWORD,
+                db=DB_NAME, minsize=1, maxsize=DB_POOL_SIZE + DB_POOL_OVERFLOW,
+                autocommit=True)
+
+    @asynccontextmanager
+    async def connection(self):
+        if self._pool is None:
+            async with self._lock:
+                if self._pool is None:
+                    await self._open()
+        if self.engine == 'sqlite':
+            raw = await self._pool.get()
+            try:
+                yield AsyncConnection(raw, self.engine)
+            finally:
+                self._pool.put_nowait(raw)
+        else:
+            async with self._pool.acquire() as raw:
+                yield AsyncConnection(raw, self.engine)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.connection() as conn:
+            if self.engine == 'sqlite':
+                await conn.raw.execute('BEGIN IMMEDIATE')
+            else:
+                await conn.raw.begin()
+            try:
+                yield conn
+            except BaseException:
+                await conn.raw.rollback()
+                raise
+            else:
+                await conn.raw.commit()
+
+    async def fetch_all(self, query):
+        async with self.connection() as conn:
+            return await conn.fetch_all(query)
+
+    async def fetch_one(self, query):
+        async with self.connection() as conn:
+            return await conn.fetch_one(query)
+
+    async def execute(self, query):
+        async with self.connection() as conn:
+            return await conn.execute(query)
+
+    async def close(self):
+        if self._pool is None:
+            return
+        pool, self._pool = self._pool, None
+        if self.engine == 'sqlite':
+            while not pool.empty():
+                await pool.get_nowait().close()
+        else:
+            pool.close()
+            await pool.wait_closed()
+
+
+adb = AsyncDatabase()
@@ -0,0 +1,106 @@
+# availability.py
+from typing import Optional
+from datetime import date
+from fastapi import HTTPException, Query
+from peewee import fn
+from models import Room, Hotel, RoomType, RoomNight
+
+# Бронирования с этими статусами не занимают номер
+INACTIVE_STATUSES = ('cancelled',)
+
+
+class SearchParams:
+    """Параметры поиска свободных номеров"""
+
+    def __init__(self,
+                 check_in: Optional[date] = None,
+                 check_out: Optional[date] = None,
+                 city: Optional[str] = None,
+                 min_capacity: Optional[int] = Query(None, ge=1),
+                 min_price: Optional[float] = Query(None, ge=0),
+                 max_price: Optional[float] = Query(None, ge=0)):
+        if (check_in is None) != (check_out is None):
+            raise HTTPException(status_code=400, detail="check_in and check_out must be given together")
+        if check_in is not None and check_in >= check_out:
+            raise HTTPException(status_code=400, detail="check_out must be after check_in")
+        self.check_in = check_in
+        self.check_out = check_out
+        self.city = city
+        self.min_capacity = min_capacity
+        self.min_price = min_price
+        self.max_price = max_price
+
+    def query(self):
+        return available_rooms(self.check_in, self.check_out, self.city,
+                               self.min_capacity, self.min_price, self.max_price)
+
+    def totals(self, rooms):
+        """Стоимость проживания на даты поиска для всех номеров страницы разом"""
+        if self.check_in is None:
+            return None
+        from pricing import quote
+        return quote([room['price_per_night'] for room in rooms], self.check_in, self.check_out)[3]
+
+
+def taken_nights(check_in, check_out):
+    """Занятые ночи [check_in, check_out) номера из внешнего запроса.
+
+    Читается реестр room_night, а не брони: запрос коррелирован с Room.id
+    и обходит диапазон первичного ключа (room_id, night), не разбирая
+    интервалы бронирований.
+    """
+    return (RoomNight
+            .select(RoomNight.night)
+            .where((RoomNight.room == Room.id) &
+                   (RoomNight.night >= check_in) &
+                   (RoomNight.night < check_out)))
+
+
+def available_rooms(check_in=None, check_out=None, city=None, min_capacity=None,
+                    min_price=None, max_price=None):
+    """Запрос номеров, свободных на даты и подходящих под фильтры.
+
+    Без дат учитывается только флаг Room.is_available. Отель и тип номера
+    присоединяются, только если по ним есть фильтр: названия для ответа
+    берутся из кэша справочников (см. describe_rooms). Внешние ключи
+    выбираются под псевдонимами, чтобы строки читались одинаково через
+    peewee .dicts() и через асинхронный драйвер.
+    """
+    query = (Room
+             .select(Room.id, Room.hotel.alias('hotel_id'), Room.room_type.alias('room_type_id'),
+                     Room.room_number, Room.price_per_night)
+             .where(Room.is_available == 1))
+    if city is not None:
+        query = query.join(Hotel).where(Hotel.city == city).switch(Room)
+    if min_capacity is not None:
+        query = query.join(RoomType).where(RoomType.capacity >= min_capacity).switch(Room)
+    if min_price is not None:
+        query = query.where(Room.price_per_night >= min_price)
+    if max_price is not None:
+        query = query.where(Room.price_per_night <= max_price)
+    if check_in is not None and check_out is not None:
+        query = query.where(~fn.EXISTS(taken_nights(check_in, check_out)))
+    return query
+
+
+def describe_rooms(rooms, hotels, room_types, totals=None):
+    """Ответ поиска: строки номеров с названиями отеля и типа номера.
+
+    Если заданы даты, к строке добавляется стоимость проживания totals.
+    """
+    result = []
+    for index, room in enumerate(rooms):
+        hotel = hotels[room['hotel_id']]
+        room_type = room_types[room['room_type_id']]
+        result.append({
+            'id': room['id'],
+            'hotel_name': hotel['name'],
+            'city': hotel['city'],
+            'room_type': room_type['name'],
+            'room_number': room['room_number'],
+            'price_per_night': room['price_per_night'],
+            'capacity': room_type['capacity']
+        })
+        if totals is not None:
+            result[-1]['total_price'] = float(totals[index])
+    return result
@@ -0,0 +1,278 @@
+# benchmark.py
+"""Нагрузочный бенчмарк API.
+
+Заполняет базу синтетическими данными через пакетные эндпоинты и гоняет
+смешанную нагрузку (списки, получение по id, поиск, бронирование)
+из нескольких потоков. Для каждого маршрута выводятся число запросов,
+ошибки, req/s и задержки p50/p95/p99; результат сохраняется в JSON,
+чтобы сравнивать версии между собой.
+
+    python benchmark.py                                   # в процессе, временная SQLite
+    python benchmark.py --url http://127.0.0.1:8000       # запущенный uvicorn
+    python benchmark.py --hotels 200 --requests 20000 --concurrency 32 --output bench.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Сочи', 'Калининград', 'Екатеринбург']
+SEED_BATCH_SIZE = 1000
+# Веса операций смешанной нагрузки
+DEFAULT_MIX = {'list': 3, 'get': 4, 'search': 2, 'book': 1}
+BOOKING_START = date(2030, 1, 1)
+
+
+class BenchmarkData:
+    """id созданных записей, из которых нагрузка выбирает цели запросов"""
+
+    def __init__(self):
+        self.hotel_ids = []
+        self.room_type_ids = []
+        self.room_ids = []
+        self.guest_ids = []
+        self.booking_ids = []
+
+
+def _bulk(client, path, items):
+    ids = []
+    for start in range(0, len(items), SEED_BATCH_SIZE):
+        response = client.post(path, json=items[start:start + SEED_BATCH_SIZE])
+        if response.status_code != 200:
+            raise RuntimeError(f"Seeding {path} failed: {response.status_code} {response.text[:200]}")
+        ids.extend(response.json()['ids'])
+    return ids
+
+
+def seed(client, hotels=50, rooms_per_hotel=20, guests=1000, bookings=2000, rng=None):
+    """Создать отели, типы номеров, номера, гостей и непересекающиеся брони"""
+    rng = rng or random.Random(0)
+    data = BenchmarkData()
+    data.hotel_ids = _bulk(client, '/hotels/bulk', [
+        {'name': f'Отель {i}', 'address': f'ул. Бенчмарка, {i}', 'city': CITIES[i % len(CITIES)],
+         'rating': round(rng.uniform(3, 5), 1)} for i in range(hotels)])
+    data.room_type_ids = _bulk(client, '/room_types/bulk', [
+        {'name': name, 'description': name, 'capacity': capacity}
+        for name, capacity in (('Эконом', 1), ('Стандарт', 2), ('Семейный', 4), ('Люкс', 3))])
+    data.room_ids = _bulk(client, '/rooms/bulk', [
+        {'hotel_id': hotel_id, 'room_type_id': rng.choice(data.room_type_ids), 'room_number': 100 + number,
+         'price_per_night': rng.randrange(2000, 20000, 100), 'is_available': 1}
+        for hotel_id in data.hotel_ids for number in range(rooms_per_hotel)])
+    data.guest_ids = _bulk(client, '/guests/bulk', [
+        {'first_name': f'Гость{i}', 'last_name': 'Тестов', 'email': f'guest{i}@bench.local',
+         'phone': f'+7999{i:07d}'} for i in range(guests)])
+    # Брони одного номера идут неделя за неделей и не пересекаются
+    rooms = len(data.room_ids)
+    data.booking_ids = _bulk(client, '/bookings/bulk', [
+        {'guest_id': rng.choice(data.guest_ids), 'room_id': data.room_ids[i % rooms],
+         'check_in_date': (BOOKING_START + timedelta(weeks=i // rooms)).isoformat(),
+         'check_out_date': (BOOKING_START + timedelta(weeks=i // rooms, days=rng.randrange(1, 7))).isoformat(),
+         'status': 'confirmed'} for i in range(bookings)])
+    return data
+
+
+def _stay(rng):
+    check_in = BOOKING_START + timedelta(days=rng.randrange(3650))
+    return check_in.isoformat(), (check_in + timedelta(days=rng.randrange(1, 8))).isoformat()
+
+
+def operation(kind, data, rng):
+    """Запрос операции: (метка маршрута, метод, путь, параметры, тело)"""
+    if kind == 'list':
+        resource = rng.choice(['hotels', 'rooms', 'guests', 'bookings'])
+        return f'GET /{resource}/', 'GET', f'/{resource}/', {'limit': 100}, None
+    if kind == 'get':
+        resource, ids = rng.choice([('hotels', data.hotel_ids), ('rooms', data.room_ids),
+                                    ('guests', data.guest_ids), ('bookings', data.booking_ids)])
+        return f'GET /{resource}/{{id}}', 'GET', f'/{resource}/{rng.choice(ids)}', None, None
+    if kind == 'search':
+        check_in, check_out = _stay(rng)
+        params = {'check_in': check_in, 'check_out': check_out, 'city': rng.choice(CITIES), 'limit': 50}
+        return 'GET /rooms/search/available_rooms', 'GET', '/rooms/search/available_rooms', params, None
+    if kind == 'book':
+        check_in, check_out = _stay(rng)
+        body = {'guest_id': rng.choice(data.guest_ids), 'room_id': rng.choice(data.room_ids),
+                'check_in_date': check_in, 'check_out_date': check_out, 'status': 'confirmed'}
+        return 'POST /bookings/', 'POST', '/bookings/', None, body
+    raise ValueError(f"Unknown operation {kind}")
+
+
+def percentile(sorted_values, fraction):
+    """Перцентиль по ближайшему рангу"""
+    if not sorted_values:
+        return None
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
+
+
+def summarize(latencies, statuses, elapsed):
+    """Сводка по маршруту: задержки в миллисекундах и коды ответов"""
+    values = sorted(latencies)
+    # 409 при бронировании — ожидаемый ответ на занятые даты, а не ошибка
+    errors = sum(count for status, count in statuses.items() if status == 0 or (status >= 400 and status != 409))
+    return {
+        'requests': len(values),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'rps': round(len(values) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(values) / len(values), 2) if values else None,
+        'p50_ms': round(percentile(values, 0.50), 2) if values else None,
+        'p95_ms': round(percentile(values, 0.95), 2) if values else None,
+        'p99_ms': round(percentile(values, 0.99), 2) if values else None,
+        'max_ms': round(values[-1], 2) if values else None,
+    }
+
+
+def run_load(make_client, data, requests=2000, concurrency=8, mix=None, seed_value=1):
+    """Выполнить requests запросов в concurrency потоков и вернуть сводку по маршрутам"""
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    lock = threading.Lock()
+    latencies = {}
+    statuses = {}
+    counter = iter(range(requests))
+
+    def worker(worker_id):
+        rng = random.Random(seed_value * 1000 + worker_id)
+        client = make_client()
+        while True:
+            with lock:
+                if next(counter, None) is None:
+                    return
+            label, method, path, params, body = operation(rng.choices(kinds, weights)[0], data, rng)
+            started = time.perf_counter()
+            try:
+                status = client.request(method, path, params=params, json=body).status_code
+            except Exception:
+                status = 0
+            latency = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.setdefault(label, []).append(latency)
+                route_statuses = statuses.setdefault(label, {})
+                route_statuses[status] = route_statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    all_statuses = {}
+    for route_statuses in statuses.values():
+        for status, count in route_statuses.items():
+            all_statuses[status] = all_statuses.get(status, 0) + count
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'total': summarize([value for values in latencies.values() for value in values], all_statuses, elapsed),
+        'routes': {label: summarize(latencies[label], statuses[label], elapsed) for label in sorted(latencies)},
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results, out=sys.stdout):
+    header = f"{'route':<40} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}"
+    print(header, file=out)
+    rows = list(results['routes'].items()) + [('TOTAL', results['total'])]
+    for label, route in rows:
+        print(f"{label:<40} {route['requests']:>7} {route['errors']:>5} {route['rps']:>8} "
+              f"{route['p50_ms']:>8} {route['p95_ms']:>8} {route['p99_ms']:>8}", file=out)
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown operation {kind}")
+        mix[kind] = int(weight or 1)
+    return mix
+
+
+def _in_process_client(args):
+    """Приложение в этом же процессе поверх временной SQLite-базы"""
+    if 'DB_ENGINE' not in os.environ:
+        os.environ['DB_ENGINE'] = 'sqlite'
+        os.environ['DB_NAME'] = os.path.join(tempfile.mkdtemp(prefix='hotel-bench-'), 'bench.db')
+    os.environ.setdefault('DB_POOL_SIZE', str(args.concurrency))
+    from fastapi.testclient import TestClient
+    from main import app
+    from database import db
+    from migrations import migrate
+    # Миграции данных запуск приложения на непустой базе не применяет
+    with db.connection_context():
+        migrate()
+    client = TestClient(app)
+    client.__enter__()
+    return client, lambda: client
+
+
+def _url_client(url):
+    import requests
+
+    class Session(requests.Session):
+        def request(self, method, path, **kwargs):
+            return super().request(method, url.rstrip('/') + path, **kwargs)
+
+    return Session(), Session
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Hotel booking API load benchmark")
+    parser.add_argument('--url', help="benchmark a running server instead of the in-process app")
+    parser.add_argument('--hotels', type=int, default=50)
+    parser.add_argument('--rooms-per-hotel', type=int, default=20)
+    parser.add_argument('--guests', type=int, default=1000)
+    parser.add_argument('--bookings', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help="operation weights, e.g. list=3,get=4,search=2,book=1")
+    parser.add_argument('--seed', type=int, default=1, help="random seed for data and workload")
+    parser.add_argument('--output', help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        client, make_client = _url_client(args.url)
+    else:
+        client, make_client = _in_process_client(args)
+
+    started = time.perf_counter()
+    data = seed(client, args.hotels, args.rooms_per_hotel, args.guests, args.bookings, random.Random(args.seed))
+    seed_seconds = time.perf_counter() - started
+    print(f"Seeded {len(data.room_ids)} rooms, {len(data.booking_ids)} bookings in {seed_seconds:.2f}s",
+          file=sys.stderr)
+
+    results = run_load(make_client, data, args.requests, args.concurrency, args.mix, args.seed)
+    results.update({
+        'target': args.url or 'in-process',
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {key: value for key, value in vars(args).items() if key not in ('url', 'output')},
+        'seed_s': round(seed_seconds, 3),
+    })
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output:
+            json.dump(results, output, ensure_ascii=False, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()
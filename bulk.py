@@ -0,0 +1,53 @@
+# bulk.py
+from fastapi import HTTPException
+from peewee import chunked, MySQLDatabase
+from database import db
+
+# Сколько объектов можно передать в одном запросе
+BULK_MAX_ITEMS = 100000
+# Сколько строк уходит в один многострочный INSERT
+BULK_BATCH_SIZE = 1000
+# Сколько id проверяется одним запросом IN
+LOOKUP_BATCH_SIZE = 1000
+
+
+def check_bulk_size(items):
+    if not items:
+        raise HTTPException(status_code=400, detail="Empty bulk request")
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(status_code=413,
+                            detail=f"Too many items, maximum is {BULK_MAX_ITEMS}")
+
+
+def check_references(model, ids, detail):
+    """Проверить, что все ссылки существуют, одним запросом IN на пачку id"""
+    wanted = set(ids)
+    found = set()
+    for batch in chunked(wanted, LOOKUP_BATCH_SIZE):
+        query = model.select(model.id).where(model.id.in_(batch)).tuples()
+        found.update(row_id for (row_id,) in query)
+    missing = sorted(wanted - found)
+    if missing:
+        raise HTTPException(status_code=422, detail={'message': detail, 'missing_ids': missing})
+
+
+def inserted_ids(last_id, count):
+    """Восстановить id строк одного многострочного INSERT.
+
+    MySQL возвращает id первой вставленной строки, SQLite — последней.
+    Для INSERT ... VALUES с известным числом строк InnoDB выделяет
+    auto-increment значения одним непрерывным блоком.
+    """
+    if isinstance(db, MySQLDatabase):
+        return list(range(last_id, last_id + count))
+    return list(range(last_id - count + 1, last_id + 1))
+
+
+def bulk_insert(model, rows):
+    """Вставить строки пачками в одной транзакции и вернуть их id по порядку"""
+    ids = []
+    with db.atomic():
+        for batch in chunked(rows, BULK_BATCH_SIZE):
+            last_id = model.insert_many(batch).execute()
+            ids.extend(inserted_ids(last_id, len(batch)))
+    return ids
@@ -0,0 +1,118 @@
+# cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from peewee import chunked
+from models import Hotel, RoomType
+
+CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', 10000))
+# Записи живут ограниченное время: изменения, сделанные другими
+# процессами, видны не позже чем через CACHE_TTL секунд
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 60))
+
+MISSING = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш с ограничением размера и временем жизни записей"""
+
+    def __init__(self, maxsize=CACHE_MAX_SIZE, ttl=CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'max_size': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class ReferenceCache(LRUCache):
+    """Кэш строк справочной таблицы по id с чтением из БД при промахе.
+
+    Строки хранятся словарями с теми же ключами, что отдаёт API.
+    """
+
+    def __init__(self, model, **kwargs):
+        super().__init__(**kwargs)
+        self.model = model
+
+    def _split(self, ids):
+        found, missing = {}, []
+        for object_id in set(ids):
+            row = self.get(object_id)
+            if row is MISSING:
+                missing.append(object_id)
+            else:
+                found[object_id] = row
+        return found, missing
+
+    def _store(self, found, rows):
+        for row in rows:
+            self.set(row['id'], row)
+            found[row['id']] = row
+
+    def get_many(self, ids):
+        """Строки по id; промахи дочитываются одним запросом IN на пачку"""
+        found, missing = self._split(ids)
+        for batch in chunked(missing, 1000):
+            self._store(found, self.model.select().where(self.model.id.in_(batch)).dicts())
+        return found
+
+    async def aget_many(self, ids):
+        """То же, что get_many, но промахи читаются через асинхронный драйвер"""
+        from async_db import adb
+        found, missing = self._split(ids)
+        for batch in chunked(missing, 1000):
+            self._store(found, await adb.fetch_all(self.model.select().where(self.model.id.in_(batch))))
+        return found
+
+    def get_one(self, object_id):
+        """Строка по id или None, если её нет в БД"""
+        return self.get_many([object_id]).get(object_id)
+
+
+hotel_cache = ReferenceCache(Hotel)
+room_type_cache = ReferenceCache(RoomType)
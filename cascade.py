@@ -0,0 +1,140 @@
+# cascade.py
+"""Удаление отеля, номера или гостя вместе с зависимыми записями.
+
+Вместо delete_instance(recursive=True), который удаляет зависимые
+строки по одной, удаление идёт пачками: выбираются id очередных
+CASCADE_BATCH_SIZE бронирований, затем одним DELETE ... IN удаляются
+их ночи в реестре и сами брони. Каждая пачка — отдельная короткая
+транзакция, поэтому блокировки не держатся на всё время удаления;
+порядок «ночи → брони → номера → объект» не нарушает внешние ключи,
+если удаление прервётся посередине.
+
+Режим dry_run только считает, сколько строк будет удалено.
+"""
+import os
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from database import db
+from models import Hotel, Room, Guest, Booking, RoomNight
+from jobs import jobs
+
+CASCADE_BATCH_SIZE = int(os.environ.get('CASCADE_BATCH_SIZE', 1000))
+
+
+class Cascade:
+    """Что удаляется вместе с объектом: запросы id зависимых броней и номеров"""
+
+    def __init__(self, model, object_id):
+        self.model = model
+        self.object_id = object_id
+        if model is Hotel:
+            self.bookings = Booking.select(Booking.id).join(Room).where(Room.hotel == object_id)
+            self.rooms = Room.select(Room.id).where(Room.hotel == object_id)
+        elif model is Room:
+            self.bookings = Booking.select(Booking.id).where(Booking.room == object_id)
+            self.rooms = None
+        elif model is Guest:
+            self.bookings = Booking.select(Booking.id).where(Booking.guest == object_id)
+            self.rooms = None
+        else:
+            raise ValueError(f"No cascade for {model.__name__}")
+        self.name = model._meta.table_name
+
+    def exists(self):
+        return self.model.select().where(self.model.id == self.object_id).exists()
+
+    def tables(self):
+        """Таблицы, из которых удаляются строки, в порядке удаления"""
+        tables = ['room_night', 'booking']
+        if self.rooms is not None or self.model is Room:
+            tables.append('room')
+        if self.name not in tables:
+            tables.append(self.name)
+        return tables
+
+    def count(self):
+        """Число строк каждой таблицы, которые будут удалены"""
+        counts = {
+            'room_night': RoomNight.select().where(RoomNight.booking.in_(self.bookings)).count(),
+            'booking': self.bookings.count(),
+        }
+        if self.rooms is not None:
+            counts['room'] = self.rooms.count()
+        counts[self.name] = 1
+        return counts
+
+    def _delete_batches(self, query, delete, counts, progress):
+        while True:
+            # Список id, а не подзапрос: MySQL не удаляет из таблицы,
+            # которую тот же запрос читает с LIMIT
+            ids = [row[0] for row in query.limit(CASCADE_BATCH_SIZE).tuples()]
+            if not ids:
+                return
+            with db.atomic():
+                for table, deleted in delete(ids).items():
+                    counts[table] += deleted
+            if progress is not None:
+                progress(dict(counts))
+
+    @staticmethod
+    def _delete_bookings(ids):
+        return {
+            'room_night': RoomNight.delete().where(RoomNight.booking.in_(ids)).execute(),
+            'booking': Booking.delete().where(Booking.id.in_(ids)).execute(),
+        }
+
+    @staticmethod
+    def _delete_rooms(ids):
+        # Ночи без брони могли остаться после правок в обход API
+        return {
+            'room_night': RoomNight.delete().where(RoomNight.room.in_(ids)).execute(),
+            'room': Room.delete().where(Room.id.in_(ids)).execute(),
+        }
+
+    def run(self, progress=None):
+        """Удалить пачками и вернуть число удалённых строк по таблицам.
+
+        progress(counts) вызывается после каждой пачки.
+        """
+        counts = dict.fromkeys(self.tables(), 0)
+        self._delete_batches(self.bookings, self._delete_bookings, counts, progress)
+        if self.rooms is not None:
+            self._delete_batches(self.rooms, self._delete_rooms, counts, progress)
+        with db.atomic():
+            if self.model is Room:
+                for table, deleted in self._delete_rooms([self.object_id]).items():
+                    counts[table] += deleted
+            else:
+                counts[self.name] = self.model.delete().where(self.model.id == self.object_id).execute()
+        return counts
+
+
+def cascade_for(model, object_id, not_found):
+    """Cascade существующего объекта; 404, если его нет"""
+    cascade = Cascade(model, object_id)
+    if not cascade.exists():
+        raise HTTPException(status_code=404, detail=not_found)
+    return cascade
+
+
+def cascade_delete(model, object_id, not_found, message, dry_run=False, background=False, after=None):
+    """Ответ эндпоинта удаления.
+
+    dry_run — только счётчики; background — задание в фоне, ответ 202
+    с адресом статуса /jobs/{id}. after() сбрасывает кэши после удаления.
+    """
+    cascade = cascade_for(model, object_id, not_found)
+    if dry_run:
+        return {'dry_run': True, 'counts': cascade.count()}
+
+    def delete(progress=None):
+        try:
+            return cascade.run(progress)
+        finally:
+            if after is not None:
+                after()
+
+    if background:
+        job = jobs.submit(f'delete_{cascade.name}', delete)
+        return JSONResponse(status_code=202, content=dict(job.to_dict(), status_url=f'/jobs/{job.id}'))
+    return {'message': message, 'deleted': delete()}
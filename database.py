@@ -1,5 +1,136 @@
 # database.py
-from peewee import MySQLDatabase
+import os
+import time
+import threading
+import functools
+import inspect
+from fastapi.routing import APIRoute
+from playhouse.pool import PooledMySQLDatabase, PooledSqliteDatabase
+import query_stats
 
-db = MySQLDatabase('hotel_booking', user='root', password='root',
-                   port=3306, host='localhost')
\ No newline at end of file
+DB_ENGINE = os.environ.get('DB_ENGINE', 'mysql')
+DB_NAME = os.environ.get('DB_NAME', 'hotel_booking')
+DB_USER = os.environ.get('DB_USER', 'root')
+DB_PASSWORD = os.environ.get('DB_PASSWORD', 'root')
+DB_HOST = os.environ.get('DB_HOST', 'localhost')
+DB_PORT = int(os.environ.get('DB_PORT', 3306))
+
+# Постоянно открытые соединения пула
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+# Сколько соединений сверх пула можно открыть под пиковую нагрузку;
+# при возврате они закрываются, а не остаются в пуле
+DB_POOL_OVERFLOW = int(os.environ.get('DB_POOL_OVERFLOW', 10))
+# Через сколько секунд простоя соединение считается устаревшим
+DB_POOL_STALE_TIMEOUT = int(os.environ.get('DB_POOL_STALE_TIMEOUT', 300))
+# Сколько секунд ждать свободного соединения (0 — без ограничения)
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+
+
+class PoolStatsMixin:
+    """Пул с ограничением переполнения и статистикой ожидания соединений"""
+
+    def __init__(self, database, pool_size=DB_POOL_SIZE, **kwargs):
+        self._pool_size = pool_size
+        self._stats_lock = threading.Lock()
+        self._waiting = 0
+        self._checkouts = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        super().__init__(database, **kwargs)
+
+    def connect(self, reuse_if_open=False):
+        start = time.perf_counter()
+        with self._stats_lock:
+            self._waiting += 1
+        try:
+            return super().connect(reuse_if_open)
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._stats_lock:
+                self._waiting -= 1
+                self._checkouts += 1
+                self._wait_time += elapsed
+                self._max_wait_time = max(self._max_wait_time, elapsed)
+
+    def _can_reuse(self, conn):
+        # Вызывается под блокировкой пула при возврате соединения; проверка
+        # родителя откатывает незавершённую транзакцию и отбрасывает сломанное соединение
+        return len(self._connections) < self._pool_size and super()._can_reuse(conn)
+
+    def pool_stats(self):
+        """Снимок состояния пула"""
+        with self._pool_lock:
+            in_use = len(self._in_use)
+            idle = len(self._connections)
+        with self._stats_lock:
+            return {
+                'pool_size': self._pool_size,
+                'max_connections': self._max_connections,
+                'in_use': in_use,
+                'idle': idle,
+                'waiting': self._waiting,
+                'checkouts': self._checkouts,
+                'wait_time_total_ms': round(self._wait_time * 1000, 3),
+                'wait_time_max_ms': round(self._max_wait_time * 1000, 3),
+            }
+
+
+class QueryStatsMixin:
+    """Учёт числа и времени запросов для счётчика текущего HTTP-запроса"""
+
+    def execute_sql(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().execute_sql(*args, **kwargs)
+        finally:
+            query_stats.record(time.perf_counter() - start)
+
+
+class HotelMySQLDatabase(QueryStatsMixin, PoolStatsMixin, PooledMySQLDatabase):
+    pass
+
+
+class HotelSqliteDatabase(QueryStatsMixin, PoolStatsMixin, PooledSqliteDatabase):
+    pass
+
+
+def create_database():
+    pool_options = {
+        'pool_size': DB_POOL_SIZE,
+        'max_connections': DB_POOL_SIZE + DB_POOL_OVERFLOW,
+        'stale_timeout': DB_POOL_STALE_TIMEOUT,
+        'timeout': DB_POOL_TIMEOUT,
+    }
+    if DB_ENGINE == 'sqlite':
+        # Локальная база для тестов и разработки
+        return HotelSqliteDatabase(DB_NAME, check_same_thread=False,
+                                   pragmas={'journal_mode': 'wal', 'busy_timeout': 5000},
+                                   **pool_options)
+    return HotelMySQLDatabase(DB_NAME, user=DB_USER, password=DB_PASSWORD,
+                              port=DB_PORT, host=DB_HOST, **pool_options)
+
+
+db = create_database()
+
+
+def with_connection(endpoint):
+    """Открыть соединение из пула на время вызова эндпоинта и вернуть его.
+
+    Соединения peewee привязаны к потоку, поэтому соединение берётся
+    в том же потоке threadpool, где выполняется синхронный эндпоинт.
+    """
+    if inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        with db.connection_context():
+            return endpoint(*args, **kwargs)
+    return wrapper
+
+
+class DatabaseRoute(APIRoute):
+    """Маршрут, каждый вызов которого выполняется со своим соединением"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, with_connection(endpoint), **kwargs)
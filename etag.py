@@ -0,0 +1,43 @@
+# etag.py
+import hashlib
+from fastapi import Request, Response
+
+
+def make_etag(data):
+    """Слабый ETag по содержимому: хэш repr данных строки или страницы.
+
+    Хэшируются сырые значения колонок, поэтому проверка не требует
+    сборки ответа и JSON-сериализации.
+    """
+    digest = hashlib.blake2b(repr(data).encode('utf-8'), digest_size=16).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Сравнение слабое: префикс W/ не учитывается
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
+
+
+def conditional(request: Request, response: Response, data):
+    """Выставить ETag; вернуть ответ 304, если у клиента актуальная копия.
+
+    Эндпоинт вызывает conditional до сборки тела и, если вернулся ответ,
+    отдаёт его как есть.
+    """
+    etag = make_etag(data)
+    response.headers['ETag'] = etag
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=dict(response.headers))
+    return None
+
@@ -0,0 +1,57 @@
+# guest_search.py
+"""Поиск гостей по началу имени, фамилии, email или телефона.
+
+Каждое поле ищется отдельным запросом LIKE 'префикс%' по своему индексу
+с ORDER BY по тому же полю и LIMIT, поэтому запрос читает не больше
+limit записей индекса, сколько бы гостей ни было в таблице. Результаты
+полей склеиваются без повторов в порядке: имя, фамилия, email, телефон.
+Индексы обновляет сама БД, отдельного поискового индекса в памяти нет.
+
+Поиск без учёта регистра обеспечивает collation столбцов в MySQL
+(*_ci). В SQLite LIKE с ESCAPE индекс не использует, там поиск —
+полный просмотр таблицы.
+"""
+import re
+from models import Guest
+from serializers import guest_serializer
+
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+_PHONE = re.compile(r'^\+?[0-9][0-9\s()\-]*$')
+
+
+def prefix_matches(field, prefix, limit, extra=None):
+    query = guest_serializer.select().where(field.startswith(prefix))
+    if extra is not None:
+        query = query.where(extra)
+    return query.order_by(field, Guest.id).limit(limit)
+
+
+def candidate_queries(q, limit):
+    """Запросы по полям, в которых имеет смысл искать строку q"""
+    if '@' in q:
+        return [prefix_matches(Guest.email, q, limit)]
+    if _PHONE.match(q):
+        return [prefix_matches(Guest.phone, q, limit)]
+    if ' ' in q:
+        # «Иван Пет» — имя и начало фамилии, в любом порядке
+        first, rest = q.split(' ', 1)
+        rest = rest.strip()
+        return [prefix_matches(Guest.first_name, first, limit, Guest.last_name.startswith(rest)),
+                prefix_matches(Guest.last_name, first, limit, Guest.first_name.startswith(rest))]
+    return [prefix_matches(Guest.first_name, q, limit),
+            prefix_matches(Guest.last_name, q, limit),
+            prefix_matches(Guest.email, q, limit)]
+
+
+def search_guests(q, limit=SEARCH_DEFAULT_LIMIT):
+    """Гости, у которых одно из полей начинается с q; не больше limit"""
+    q = ' '.join(q.split())
+    found = {}
+    for query in candidate_queries(q, limit):
+        for guest in query:
+            found.setdefault(guest['id'], guest)
+            if len(found) >= limit:
+                return list(found.values())
+    return list(found.values())
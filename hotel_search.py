@@ -0,0 +1,215 @@
+# hotel_search.py
+"""Поиск отелей по городу, рейтингу и цене номера с подсчётом фасетов.
+
+Поиск идёт по индексу в памяти: массивы numpy с городом и рейтингом
+каждого отеля и ценами доступных номеров, отсортированными по цене.
+Фильтр и фасеты — маски и bincount по этим массивам, без запросов
+к БД; сами строки страницы берутся из hotel_cache.
+
+Индекс строится двумя запросами при первом поиске. Обработчики записи
+отелей и номеров помечают его устаревшим, и следующий поиск запускает
+перестроение в фоне, продолжая отвечать по прежнему снимку: на больших
+таблицах построение занимает секунды. Поэтому запись видна в поиске
+не сразу, а после перестроения; изменения из других процессов — не
+позже чем через CACHE_TTL секунд и время построения.
+
+Фасеты считаются по остальным фильтрам: счётчики городов не зависят
+от выбранного города, счётчики рейтинга — от минимального рейтинга,
+чтобы интерфейс мог показать, сколько отелей даст другой выбор.
+"""
+import sys
+import time
+import threading
+from typing import Optional
+from fastapi import HTTPException, Query
+from database import db
+from models import Hotel, Room
+from cache import CACHE_TTL
+
+SORT_FIELDS = ('rating', '-rating', 'price', '-price', 'id', '-id')
+SEARCH_MAX_LIMIT = 100
+# Корзины рейтинга: 0-1, 1-2, ..., 4-5 (рейтинг 5 попадает в последнюю)
+RATING_BUCKETS = 5
+
+
+class HotelSearchParams:
+    """Параметры поиска отелей"""
+
+    def __init__(self,
+                 city: Optional[str] = None,
+                 min_rating: Optional[float] = Query(None, ge=0, le=5),
+                 min_price: Optional[float] = Query(None, ge=0),
+                 max_price: Optional[float] = Query(None, ge=0),
+                 sort: str = '-rating',
+                 limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+                 offset: int = Query(0, ge=0)):
+        if sort not in SORT_FIELDS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_FIELDS)}")
+        if min_price is not None and max_price is not None and min_price > max_price:
+            raise HTTPException(status_code=400, detail="min_price must not exceed max_price")
+        self.city = city
+        self.min_rating = min_rating
+        self.min_price = min_price
+        self.max_price = max_price
+        self.sort = sort
+        self.limit = limit
+        self.offset = offset
+
+
+class HotelIndex:
+    """Неизменяемый снимок таблиц hotel и room для поиска"""
+
+    def __init__(self, hotels, rooms):
+        import numpy as np
+        hotel_ids, cities, ratings = zip(*hotels) if hotels else ((), (), ())
+        self.ids = np.asarray(hotel_ids, dtype=np.int64)
+        self.cities, city_codes = np.unique(np.asarray(cities, dtype=str), return_inverse=True)
+        self.city_codes = city_codes.reshape(-1)
+        self.ratings = np.asarray(ratings, dtype=float)
+        self.rating_buckets = np.clip(np.floor(self.ratings), 0, RATING_BUCKETS - 1).astype(np.int64)
+
+        room_hotels, prices = zip(*rooms) if rooms else ((), ())
+        prices = np.asarray(prices, dtype=float)
+        # Номера хранятся позицией отеля в self.ids и отсортированы по цене
+        positions = np.searchsorted(self.ids, np.asarray(room_hotels, dtype=np.int64))
+        known = positions < len(self.ids)
+        known[known] = self.ids[positions[known]] == np.asarray(room_hotels, dtype=np.int64)[known]
+        order = np.argsort(prices[known], kind='stable')
+        self.room_hotels = positions[known][order]
+        self.room_prices = prices[known][order]
+        self.built = time.monotonic()
+
+    @classmethod
+    def load(cls):
+        hotels = list(Hotel.select(Hotel.id, Hotel.city, Hotel.rating).order_by(Hotel.id).tuples())
+        rooms = list(Room.select(Room.hotel, Room.price_per_night).where(Room.is_available == 1).tuples())
+        return cls(hotels, rooms)
+
+    def min_prices(self, min_price=None, max_price=None):
+        """Минимальная цена подходящего номера каждого отеля; NaN — подходящих нет"""
+        import numpy as np
+        lo = 0 if min_price is None else np.searchsorted(self.room_prices, min_price, side='left')
+        hi = len(self.room_prices) if max_price is None else np.searchsorted(self.room_prices, max_price, side='right')
+        result = np.full(len(self.ids), np.nan)
+        np.fmin.at(result, self.room_hotels[lo:hi], self.room_prices[lo:hi])
+        return result
+
+    def search(self, params):
+        import numpy as np
+        prices = self.min_prices(params.min_price, params.max_price)
+        everything = np.ones(len(self.ids), dtype=bool)
+        price_mask = everything if params.min_price is None and params.max_price is None else ~np.isnan(prices)
+        if params.city is None:
+            city_mask = everything
+        else:
+            code = np.searchsorted(self.cities, params.city)
+            found = code < len(self.cities) and self.cities[code] == params.city
+            city_mask = self.city_codes == code if found else ~everything
+        rating_mask = everything if params.min_rating is None else self.ratings >= params.min_rating
+
+        mask = price_mask & city_mask & rating_mask
+        city_counts = np.bincount(self.city_codes[price_mask & rating_mask], minlength=len(self.cities))
+        rating_counts = np.bincount(self.rating_buckets[price_mask & city_mask], minlength=RATING_BUCKETS)
+
+        selected = np.flatnonzero(mask)
+        key = params.sort.lstrip('-')
+        values = {'rating': self.ratings, 'price': prices, 'id': self.ids}[key][selected]
+        if params.sort.startswith('-'):
+            values = -values
+        # Сортировка по полю, при равенстве по id; отели без цены — в конце
+        order = np.lexsort((self.ids[selected], values))
+        page = selected[order][params.offset:params.offset + params.limit]
+        return {
+            'total': int(mask.sum()),
+            'page': [(int(self.ids[position]), None if np.isnan(prices[position]) else float(prices[position]))
+                     for position in page],
+            'facets': {
+                'city': {str(city): int(count) for city, count in zip(self.cities, city_counts) if count},
+                'rating': {f'{bucket}-{bucket + 1}': int(count) for bucket, count in enumerate(rating_counts)},
+            },
+        }
+
+
+class HotelSearch:
+    """Текущий снимок индекса с перестроением в фоне после записи или по времени.
+
+    Только первый поиск строит индекс синхронно. Дальше запись лишь
+    помечает снимок устаревшим: поиск продолжает отвечать по старому
+    снимку, а новый строится в отдельном потоке, не более одного сразу.
+    """
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._index = None
+        self._stale = True
+        # Держится всё время построения снимка
+        self._lock = threading.Lock()
+        self._thread = None
+        self.builds = 0
+        self.build_time = 0.0
+        self.errors = 0
+
+    def invalidate(self):
+        self._stale = True
+
+    def clear(self):
+        """Забыть снимок: следующий поиск построит индекс сразу"""
+        with self._lock:
+            self._index = None
+            self._stale = True
+
+    def _build(self):
+        # Сброс до чтения: запись во время построения снова пометит индекс
+        self._stale = False
+        started = time.perf_counter()
+        self._index = HotelIndex.load()
+        self.builds += 1
+        self.build_time = time.perf_counter() - started
+
+    def _build_in_background(self):
+        try:
+            with db.connection_context():
+                self._build()
+        except Exception as error:
+            self._stale = True
+            self.errors += 1
+            print(f"Hotel search index rebuild failed: {error!r}", file=sys.stderr)
+        finally:
+            self._lock.release()
+
+    def index(self):
+        index = self._index
+        if index is None:
+            with self._lock:
+                if self._index is None:
+                    self._build()
+                return self._index
+        if self._stale or time.monotonic() - index.built >= self.ttl:
+            # Блокировку захватывает этот поток, а отпускает поток построения;
+            # если она занята, новый снимок уже строится
+            if self._lock.acquire(blocking=False):
+                self._thread = threading.Thread(target=self._build_in_background,
+                                                name='hotel-search-index', daemon=True)
+                self._thread.start()
+        return index
+
+    def wait(self, timeout=None):
+        """Дождаться фонового перестроения, если оно идёт"""
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def stats(self):
+        index = self._index
+        return {
+            'hotels': 0 if index is None else len(index.ids),
+            'rooms': 0 if index is None else len(index.room_prices),
+            'builds': self.builds,
+            'last_build_ms': round(self.build_time * 1000, 3),
+            'rebuilding': self._lock.locked(),
+            'errors': self.errors,
+            'ttl': self.ttl,
+        }
+
+
+hotel_search = HotelSearch()
@@ -0,0 +1,145 @@
+# idempotency.py
+"""Заголовок Idempotency-Key для POST-запросов.
+
+Клиент, повторяющий запрос после таймаута, передаёт тот же ключ.
+Первый запрос выполняется как обычно, его ответ (код, заголовки, тело)
+сохраняется в ограниченном LRU-кэше с TTL; повтор с тем же ключом
+получает сохранённый ответ с заголовком Idempotent-Replayed: true,
+не доходя до эндпоинта и БД.
+
+- Тот же ключ с другим телом запроса — 422: ключ уже занят другой операцией.
+- Повтор, пока первый запрос ещё выполняется, — 409.
+- Ответы 5xx не сохраняются, такой запрос можно повторить с тем же ключом.
+
+Хранилище — память процесса: при нескольких воркерах повтор,
+попавший в другой воркер, выполнится заново.
+"""
+import os
+import json
+import hashlib
+from cache import LRUCache, MISSING
+
+IDEMPOTENCY_HEADER = b'idempotency-key'
+REPLAYED_HEADER = b'idempotent-replayed'
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+IDEMPOTENCY_MAX_SIZE = int(os.environ.get('IDEMPOTENCY_MAX_SIZE', 10000))
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 24 * 3600))
+
+
+idempotency_store = LRUCache(maxsize=IDEMPOTENCY_MAX_SIZE, ttl=IDEMPOTENCY_TTL)
+
+
+class StoredResponse:
+    __slots__ = ('fingerprint', 'status', 'headers', 'body', 'route')
+
+    def __init__(self, fingerprint, status, headers, body, route=None):
+        self.fingerprint = fingerprint
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.route = route
+
+
+def _label_route(scope, route):
+    """Маршрут для метрик и /stats/queries у ответа, отданного до роутинга.
+
+    Берётся маршрут первого запроса с этим ключом. Если он неизвестен,
+    запрос остаётся unmatched: путь от клиента в метки не попадает.
+    """
+    if route is not None:
+        scope['route'] = route
+
+
+async def _read_body(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _send_json(send, status, detail, extra_headers=()):
+    body = json.dumps({'detail': detail}).encode()
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(b'content-type', b'application/json'),
+                            (b'content-length', str(len(body)).encode()), *extra_headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware: повторы POST с тем же Idempotency-Key получают первый ответ"""
+
+    def __init__(self, app, store=None):
+        self.app = app
+        self.store = store if store is not None else idempotency_store
+        # Ключ → scope запроса, который выполняется сейчас; меняется только в цикле событий
+        self.in_flight = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST':
+            await self.app(scope, receive, send)
+            return
+        key = dict(scope['headers']).get(IDEMPOTENCY_HEADER)
+        if key is None:
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            await _send_json(send, 400, f"Idempotency-Key must be 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters")
+            return
+
+        body = await _read_body(receive)
+        if body is None:
+            return
+        # Ключ действует в пределах пути: один ключ для /hotels/ и /rooms/ — разные операции
+        store_key = (scope['path'], key)
+        fingerprint = hashlib.sha256(body).hexdigest()
+
+        stored = self.store.get(store_key)
+        if stored is not MISSING:
+            _label_route(scope, stored.route)
+            if stored.fingerprint != fingerprint:
+                await _send_json(send, 422, "Idempotency-Key was already used with a different request body")
+                return
+            await send({'type': 'http.response.start', 'status': stored.status,
+                        'headers': stored.headers + [(REPLAYED_HEADER, b'true')]})
+            await send({'type': 'http.response.body', 'body': stored.body})
+            return
+        if store_key in self.in_flight:
+            _label_route(scope, self.in_flight[store_key].get('route'))
+            await _send_json(send, 409, "A request with this Idempotency-Key is already in progress",
+                             [(b'retry-after', b'1')])
+            return
+
+        body_sent = False
+
+        async def replay_body():
+            nonlocal body_sent
+            if body_sent:
+                return await receive()
+            body_sent = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        response = {}
+        chunks = []
+
+        async def capture(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+                response['headers'] = list(message.get('headers', []))
+            elif message['type'] == 'http.response.body':
+                chunks.append(message.get('body', b''))
+            await send(message)
+
+        self.in_flight[store_key] = scope
+        try:
+            await self.app(scope, replay_body, capture)
+        finally:
+            self.in_flight.pop(store_key, None)
+        # Запрос без маршрута (404/405 роутера) не сохраняется: иначе
+        # любой путь от клиента занимал бы место в хранилище
+        if response and response['status'] < 500 and scope.get('route') is not None:
+            self.store.set(store_key, StoredResponse(fingerprint, response['status'], response['headers'],
+                                                     b''.join(chunks), scope.get('route')))
@@ -0,0 +1,287 @@
+# importer.py
+"""Потоковая загрузка данных в базу.
+
+Поддерживаются дампы mysqldump (hotel_booking/*.sql), CSV с заголовком
+и NDJSON (один JSON-объект на строку). Таблица определяется по имени
+INSERT в дампе или по имени файла: hotel.csv, hotel_booking_room.ndjson.
+
+    python importer.py hotel_booking/
+    python importer.py rooms.csv bookings.ndjson --batch-size 5000
+"""
+import os
+import re
+import sys
+import csv
+import json
+import time
+import argparse
+from itertools import groupby
+from operator import itemgetter
+from peewee import chunked
+from database import db
+from migrations import migrate
+from reservations import rebuild_room_nights
+from models import Hotel, RoomType, Room, Guest, Booking
+
+# Порядок загрузки: сначала таблицы, на которые ссылаются внешние ключи
+MODELS = [Hotel, RoomType, Room, Guest, Booking]
+TABLES = {model._meta.table_name: model for model in MODELS}
+
+DEFAULT_BATCH_SIZE = 1000
+PROGRESS_INTERVAL = 1.0
+
+_INSERT = re.compile(r"INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.I)
+_VALUE = re.compile(r"\s*(?:'((?:[^'\\]|\\.|'')*)'|(NULL)|([-+0-9.eE]+))\s*([,)])", re.S)
+_ESCAPES = {'0': '\0', 'b': '\b', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a'}
+_ESCAPE = re.compile(r"\\(.)|''", re.S)
+
+
+def _unescape(value):
+    def replace(match):
+        if match.group(1) is None:
+            return "'"
+        return _ESCAPES.get(match.group(1), match.group(1))
+    return _ESCAPE.sub(replace, value)
+
+
+def _number(value):
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _parse_tuples(line, pos):
+    """Разобрать список кортежей (...),(...); начиная с позиции pos"""
+    length = len(line)
+    while pos < length:
+        while pos < length and line[pos] in ' \t\r\n,':
+            pos += 1
+        if pos >= length or line[pos] == ';':
+            return
+        if line[pos] != '(':
+            raise ValueError(f"Unexpected character {line[pos]!r} at {pos}")
+        pos += 1
+        row = []
+        while True:
+            match = _VALUE.match(line, pos)
+            if match is None:
+                raise ValueError(f"Cannot parse value at {pos}")
+            string, null, number, end = match.groups()
+            if string is not None:
+                row.append(_unescape(string))
+            elif null is not None:
+                row.append(None)
+            else:
+                row.append(_number(number))
+            pos = match.end()
+            if end == ')':
+                break
+        yield tuple(row)
+
+
+def read_sql_dump(path):
+    """Строки из INSERT-ов дампа: (таблица, колонки или None, значения).
+
+    mysqldump пишет каждый extended INSERT одной строкой, длина которой
+    ограничена net_buffer_length, поэтому файл читается построчно и память
+    не зависит от размера дампа.
+    """
+    with open(path, encoding='utf-8') as dump:
+        for line in dump:
+            match = _INSERT.match(line)
+            if match is None:
+                continue
+            table = match.group(1).lower()
+            columns = None
+            if match.group(2):
+                columns = [column.strip(' `') for column in match.group(2).split(',')]
+            for row in _parse_tuples(line, match.end()):
+                yield table, columns, row
+
+
+def read_csv(path):
+    """Колонки из заголовка CSV и поток строк; пустые значения — NULL"""
+    source = open(path, encoding='utf-8', newline='')
+    reader = csv.reader(source)
+    columns = next(reader, [])
+
+    def rows():
+        with source:
+            for row in reader:
+                yield tuple(value if value != '' else None for value in row)
+    return columns, rows()
+
+
+def read_ndjson(path):
+    """Колонки по первому объекту и поток строк в том же порядке колонок"""
+    source = open(path, encoding='utf-8')
+    records = (json.loads(line) for line in source if line.strip())
+    first = next(records, None)
+    columns = list(first) if first is not None else []
+
+    def rows():
+        with source:
+            if first is None:
+                return
+            yield tuple(first[column] for column in columns)
+            for record in records:
+                yield tuple(record.get(column) for column in columns)
+    return columns, rows()
+
+
+def table_from_filename(path):
+    name = os.path.splitext(os.path.basename(path))[0].lower()
+    if name.startswith('hotel_booking_'):
+        name = name[len('hotel_booking_'):]
+    if name not in TABLES:
+        raise ValueError(f"Cannot detect table for {path}")
+    return name
+
+
+def resolve_fields(model, columns):
+    """Поля модели по именам колонок (room_id) или полей (room)"""
+    if columns is None:
+        return model._meta.sorted_fields
+    by_name = {}
+    for field in model._meta.sorted_fields:
+        by_name[field.name] = field
+        by_name[field.column_name] = field
+    try:
+        return [by_name[column] for column in columns]
+    except KeyError as exc:
+        raise ValueError(f"Unknown column {exc.args[0]} for table {model._meta.table_name}")
+
+
+class Progress:
+    def __init__(self, label, out=sys.stderr):
+        self.label = label
+        self.out = out
+        self.rows = 0
+        self.started = time.perf_counter()
+        self.reported = self.started
+
+    def add(self, count):
+        self.rows += count
+        now = time.perf_counter()
+        if now - self.reported >= PROGRESS_INTERVAL:
+            self.reported = now
+            self.report()
+
+    def rate(self):
+        elapsed = time.perf_counter() - self.started
+        return self.rows / elapsed if elapsed > 0 else 0.0
+
+    def report(self, final=False):
+        status = 'done' if final else 'loading'
+        print(f"{self.label}: {status} {self.rows} rows, {self.rate():.0f} rows/s", file=self.out)
+
+
+def load_rows(model, fields, rows, batch_size=DEFAULT_BATCH_SIZE, ignore_duplicates=False, progress=None):
+    """Вставить поток кортежей многострочными INSERT, транзакция на пачку"""
+    total = 0
+    for batch in chunked(rows, batch_size):
+        query = model.insert_many(batch, fields=fields)
+        if ignore_duplicates:
+            query = query.on_conflict_ignore()
+        with db.atomic():
+            query.execute()
+        total += len(batch)
+        if progress is not None:
+            progress.add(len(batch))
+    return total
+
+
+def _sources(path):
+    """Источники файла: (таблица, колонки, поток кортежей)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.sql':
+        # Дамп может содержать несколько таблиц: поток режется на участки
+        # с одинаковой таблицей и набором колонок без буферизации строк
+        for (table, columns), group in groupby(read_sql_dump(path), key=itemgetter(0, 1)):
+            yield table, columns, (row for _, _, row in group)
+        return
+    if extension == '.csv':
+        reader = read_csv
+    elif extension in ('.ndjson', '.jsonl'):
+        reader = read_ndjson
+    else:
+        raise ValueError(f"Unsupported file type: {path}")
+    table = table_from_filename(path)
+    columns, rows = reader(path)
+    yield table, columns, rows
+
+
+def _table_order(path):
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        table = table_from_filename(path)
+    except ValueError:
+        if extension != '.sql':
+            raise
+        # Таблица дампа станет известна только при чтении
+        with open(path, encoding='utf-8') as dump:
+            for line in dump:
+                match = _INSERT.match(line)
+                if match:
+                    table = match.group(1).lower()
+                    break
+            else:
+                return len(MODELS)
+    return MODELS.index(TABLES[table]) if table in TABLES else len(MODELS)
+
+
+def collect_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if os.path.splitext(name)[1].lower() in ('.sql', '.csv', '.ndjson', '.jsonl'):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+    return sorted(files, key=_table_order)
+
+
+def import_files(paths, batch_size=DEFAULT_BATCH_SIZE, ignore_duplicates=False, out=sys.stderr):
+    """Загрузить файлы в порядке внешних ключей, вернуть число строк по таблицам"""
+    totals = {}
+    with db.connection_context():
+        migrate()
+        for path in collect_files(paths):
+            progress = Progress(os.path.basename(path), out)
+            for table, columns, rows in _sources(path):
+                if table not in TABLES:
+                    print(f"{path}: skipping unknown table {table}", file=out)
+                    continue
+                model = TABLES[table]
+                fields = resolve_fields(model, columns)
+                count = load_rows(model, fields, rows, batch_size, ignore_duplicates, progress)
+                totals[table] = totals.get(table, 0) + count
+            progress.report(final=True)
+        # Реестр ночей в дампах не хранится: выводим его из загруженных броней
+        if Booking._meta.table_name in totals:
+            ledger = rebuild_room_nights()
+            print(f"room_night: {ledger['nights']} nights from {ledger['bookings']} bookings", file=out)
+            if ledger['conflicts']:
+                print(f"room_night: overlapping bookings left without nights: {ledger['conflicts']}", file=out)
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import of hotel booking data")
+    parser.add_argument('paths', nargs='+', help=".sql dumps, .csv or .ndjson files or directories")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--ignore-duplicates', action='store_true',
+                        help="skip rows whose primary key already exists")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    totals = import_files(args.paths, args.batch_size, args.ignore_duplicates)
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    print(f"Imported {rows} rows in {elapsed:.2f}s ({rows / elapsed if elapsed else 0:.0f} rows/s): {totals}")
+
+
+if __name__ == "__main__":
+    main()
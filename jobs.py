@@ -0,0 +1,88 @@
+# jobs.py
+"""Фоновые задания для долгих операций (удаление отеля со всеми бронями).
+
+Задание выполняется в отдельном пуле потоков со своим соединением
+с БД, HTTP-запрос сразу получает id, а статус и прогресс читаются через
+GET /jobs/{id}. Реестр хранится в памяти процесса: статус задания
+виден только в том воркере, который его принял.
+"""
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from database import db
+
+# Один поток: тяжёлые удаления идут по очереди и не конкурируют за блокировки
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 1))
+# Сколько завершённых заданий помнить
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', 1000))
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'pending'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+            'created': self.created,
+            'finished': self.finished,
+        }
+
+
+class JobRegistry:
+    def __init__(self, workers=JOB_WORKERS, history=JOB_HISTORY):
+        self.history = history
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+
+    def submit(self, kind, func):
+        """Поставить func(progress) в очередь; progress(value) обновляет прогресс задания"""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.history:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.status in ('pending', 'running'):
+                    break
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, func)
+        return job
+
+    def _run(self, job, func):
+        job.status = 'running'
+
+        def progress(value):
+            job.progress = value
+
+        try:
+            with db.connection_context():
+                job.result = func(progress)
+            job.status = 'done'
+        except Exception as exc:
+            job.error = getattr(exc, 'detail', None) or str(exc)
+            job.status = 'failed'
+        finally:
+            job.finished = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+
+jobs = JobRegistry()
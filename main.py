@@ -1,10 +1,36 @@
+import os
+import sys
+import time
+
+# Отсчёт времени импорта приложения
+IMPORT_STARTED = time.perf_counter()
+
+from anyio import to_thread
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from database import db
+from async_db import adb
+from cache import hotel_cache, room_type_cache
+from hotel_search import hotel_search
+from idempotency import IdempotencyMiddleware, idempotency_store
 from contextlib import asynccontextmanager
-from models import Hotel, RoomType, Room, Guest, Booking  # Импорт из models.py
-from routers import hotels_router, room_types_router, rooms_router, guests_router, bookings_router
+from migrations import check_schema
+from serializers import FastJSONResponse
+from query_stats import QueryStatsMiddleware, route_totals
+import metrics
+from routers import hotels_router, room_types_router, rooms_router, guests_router, bookings_router, async_router, quotes_router, jobs_router
+
+app = FastAPI(title="Hotel Booking API", version="1.0.0", default_response_class=FastJSONResponse)
 
-app = FastAPI(title="Hotel Booking API", version="1.0.0")
+# Повторы POST с тем же Idempotency-Key; внутренний слой, чтобы повтор
+# тоже получил заголовки X-DB-Queries. Повтор отдаётся до роутинга,
+# поэтому middleware сам ставит в scope маршрут первого запроса:
+# в метриках и /stats/queries повторы считаются по своему маршруту
+app.add_middleware(IdempotencyMiddleware)
+# Число и время SQL-запросов в заголовках каждого ответа
+app.add_middleware(QueryStatsMiddleware)
+# Внешний слой: задержка считается с учётом остальных middleware
+app.add_middleware(metrics.MetricsMiddleware)
 
 # Подключение всех роутеров
 app.include_router(hotels_router)
@@ -12,22 +38,122 @@ app.include_router(room_types_router)
 app.include_router(rooms_router)
 app.include_router(guests_router)
 app.include_router(bookings_router)
+app.include_router(async_router)
+app.include_router(quotes_router)
+app.include_router(jobs_router)
+
+# Быстрый запуск: без проверки схемы и DDL, первое соединение с БД
+# открывает первый запрос. Схему заранее обновляет python migrations.py
+FAST_STARTUP = os.environ.get('FAST_STARTUP', '0') == '1'
+
+def elapsed_ms(started, finished):
+    return round((finished - started) * 1000, 1)
 
-# Создание таблиц при запуске
+startup_timings = {
+    'fast_startup': FAST_STARTUP,
+    'import_ms': elapsed_ms(IMPORT_STARTED, time.perf_counter()),
+    'startup_ms': None,
+    'ready_ms': None
+}
+
+# Проверка версии схемы при запуске; DDL — только если схема отстала
 @app.on_event("startup")
 def startup():
-    db.connect()
-    db.create_tables([Hotel, RoomType, Room, Guest, Booking], safe=True)
+    started = time.perf_counter()
+    if not FAST_STARTUP:
+        with db.connection_context():
+            check_schema()
+    finished = time.perf_counter()
+    startup_timings['startup_ms'] = elapsed_ms(started, finished)
+    startup_timings['ready_ms'] = elapsed_ms(IMPORT_STARTED, finished)
+    print(f"Startup: import {startup_timings['import_ms']} ms, startup {startup_timings['startup_ms']} ms, "
+          f"fast_startup={FAST_STARTUP}", file=sys.stderr)
 
 @app.on_event("shutdown")
 def shutdown():
-    if not db.is_closed():
-        db.close()
+    db.close_all()
+
+@app.on_event("shutdown")
+async def shutdown_async_db():
+    await adb.close()
 
 @app.get("/")
 def root():
     return {"message": "Hotel Booking API is running"}
 
+@app.get("/stats/db_pool")
+def db_pool_stats():
+    """Состояние пула соединений с БД"""
+    return db.pool_stats()
+
+@app.get("/stats/cache")
+def cache_stats():
+    """Попадания и промахи кэша справочников"""
+    return {
+        'hotels': hotel_cache.stats(),
+        'room_types': room_type_cache.stats(),
+        'hotel_search': hotel_search.stats(),
+        'idempotency': idempotency_store.stats()
+    }
+
+@app.get("/stats/queries")
+def query_stats_by_route():
+    """Число SQL-запросов и время БД по маршрутам"""
+    return route_totals.snapshot()
+
+def pool_metrics():
+    stats = db.pool_stats()
+    return (
+        metrics.samples('db_pool_connections', 'DB pool connections by state', 'gauge',
+                        [((('state', 'in_use'),), stats['in_use']), ((('state', 'idle'),), stats['idle'])])
+        + metrics.samples('db_pool_size', 'Connections kept open by the DB pool', 'gauge', [((), stats['pool_size'])])
+        + metrics.samples('db_pool_waiting', 'Requests waiting for a DB connection', 'gauge', [((), stats['waiting'])])
+        + metrics.samples('db_pool_checkouts_total', 'DB connection checkouts', 'counter', [((), stats['checkouts'])])
+        + metrics.samples('db_pool_wait_seconds_total', 'Time spent waiting for a DB connection', 'counter',
+                          [((), stats['wait_time_total_ms'] / 1000)])
+    )
+
+def threadpool_metrics():
+    # Лимитер anyio, в котором выполняются синхронные эндпоинты
+    limiter = to_thread.current_default_thread_limiter()
+    return (
+        metrics.samples('threadpool_threads_busy', 'Threadpool tokens taken by sync endpoints', 'gauge',
+                        [((), limiter.borrowed_tokens)])
+        + metrics.samples('threadpool_threads_total', 'Threadpool size', 'gauge', [((), limiter.total_tokens)])
+        + metrics.samples('threadpool_waiting', 'Tasks waiting for a threadpool thread', 'gauge',
+                          [((), limiter.statistics().tasks_waiting)])
+    )
+
+def cache_metrics():
+    caches = {'hotels': hotel_cache.stats(), 'room_types': room_type_cache.stats()}
+    lines = []
+    for name, kind, key in (('cache_hits_total', 'counter', 'hits'), ('cache_misses_total', 'counter', 'misses'),
+                            ('cache_evictions_total', 'counter', 'evictions'), ('cache_entries', 'gauge', 'size')):
+        lines += metrics.samples(name, f'Reference cache {key}', kind,
+                                 [((('cache', cache),), stats[key]) for cache, stats in caches.items()])
+    return lines
+
+def query_metrics():
+    totals = route_totals.snapshot()
+    labels = {route: (('method', route.partition(' ')[0]), ('route', route.partition(' ')[2])) for route in totals}
+    return (
+        metrics.samples('db_queries_total', 'SQL queries by route', 'counter',
+                        [(labels[route], route_stats['queries']) for route, route_stats in totals.items()])
+        + metrics.samples('db_query_seconds_total', 'Time spent in SQL queries by route', 'counter',
+                          [(labels[route], route_stats['db_time_ms'] / 1000) for route, route_stats in totals.items()])
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    body = metrics.render([pool_metrics, threadpool_metrics, cache_metrics, query_metrics])
+    return PlainTextResponse(body, media_type=metrics.CONTENT_TYPE)
+
+@app.get("/stats/startup")
+def startup_stats():
+    """Время импорта приложения и обработчика запуска"""
+    return startup_timings
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,159 @@
+# metrics.py
+"""Метрики приложения в текстовом формате Prometheus.
+
+MetricsMiddleware считает запросы и задержки по шаблону маршрута,
+коду ответа и методу. Гистограмма с фиксированными корзинами: на запрос
+один bisect и несколько сложений под блокировкой, поэтому метрики можно
+не выключать под нагрузкой. Состояние пула БД, threadpool, кэшей
+и счётчики SQL-запросов снимаются только в момент чтения /metrics.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from query_stats import route_label
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Границы корзин задержки, секунды
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Гистограмма по наборам меток: счётчики корзин, сумма и количество"""
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Последняя ячейка — корзина +Inf
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        with self._lock:
+            series = [(labels, list(counts), total, count)
+                      for labels, (counts, total, count) in sorted(self._series.items())]
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        bounds = self.buckets + (float('inf'),)
+        for labels, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{format_labels(labels + (("le", format_value(bound)),))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(labels)} {format_value(total)}')
+            lines.append(f'{self.name}_count{format_labels(labels)} {count}')
+        return lines
+
+
+class Counter:
+    """Монотонный счётчик по наборам меток"""
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def collect(self):
+        with self._lock:
+            series = sorted(self._series.items())
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        lines.extend(f'{self.name}{format_labels(labels)} {format_value(value)}' for labels, value in series)
+        return lines
+
+
+def samples(name, help_text, kind, values):
+    """Строки метрики, значения которой снимаются при чтении: values — список (метки, значение)"""
+    lines = [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+    lines.extend(f'{name}{format_labels(labels)} {format_value(value)}' for labels, value in values)
+    return lines
+
+
+request_latency = Histogram('http_request_duration_seconds', 'HTTP request latency by route')
+requests_total = Counter('http_requests_total', 'HTTP requests by route and status code')
+# Меняется только в цикле событий, блокировка не нужна
+_in_progress = {'value': 0}
+
+
+def requests_in_progress():
+    return _in_progress['value']
+
+
+class MetricsMiddleware:
+    """ASGI middleware: задержка, коды ответов и число запросов в работе"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        _in_progress['value'] += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            _in_progress['value'] -= 1
+            method, _, path = route_label(scope).partition(' ')
+            request_latency.observe((('method', method), ('route', path)), elapsed)
+            requests_total.inc((('method', method), ('route', path), ('status', str(status[0]))))
+
+
+def render(sources=()):
+    """Текст всех метрик; sources — функции, возвращающие строки снимков"""
+    lines = requests_total.collect() + request_latency.collect()
+    lines.extend(samples('http_requests_in_progress', 'HTTP requests being processed', 'gauge',
+                         [((), requests_in_progress())]))
+    for source in sources:
+        lines.extend(source())
+    return '\n'.join(lines) + '\n'
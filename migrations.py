@@ -0,0 +1,201 @@
+# migrations.py
+"""Версионные миграции схемы.
+
+Номер применённой миграции хранится в таблице schema_version. При запуске
+приложение только читает этот номер; DDL выполняется, лишь если схема
+отстаёт от кода.
+
+    python migrations.py              # применить новые миграции
+    python migrations.py --status     # текущая и последняя версии
+    python migrations.py --target 1   # применить миграции до версии 1
+
+Новая миграция — функция с декоратором @migration и следующим номером.
+Уже выпущенные миграции не меняются. Миграции данных переписывают
+таблицы целиком и на большой базе идут долго. Параметр data — функция,
+которая проверяет, есть ли что переписывать: на пустой базе такая
+миграция выполняется и при запуске приложения, иначе запуск применяет
+схему до неё и останавливается с просьбой запустить эту команду.
+"""
+import os
+import argparse
+import datetime
+from contextlib import contextmanager
+from peewee import IntegerField, CharField, DateTimeField, MySQLDatabase, OperationalError, ProgrammingError, fn
+from database import db
+from models import BaseModel, Hotel, RoomType, Room, Guest, Booking, RoomNight
+
+# Без этого флага отставшая схема останавливает запуск, а миграции
+# применяются отдельной командой до выкладки
+MIGRATE_ON_STARTUP = os.environ.get('DB_MIGRATE_ON_STARTUP', '1') == '1'
+# Сколько ждать, пока миграции применяет другой процесс
+MIGRATION_LOCK_TIMEOUT = int(os.environ.get('DB_MIGRATION_LOCK_TIMEOUT', 60))
+MIGRATION_LOCK = 'hotel_booking_schema_migrations'
+
+
+class SchemaVersion(BaseModel):
+    version = IntegerField(primary_key=True)
+    name = CharField()
+    applied_at = DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        table_name = 'schema_version'
+
+
+MIGRATIONS = []
+
+
+def migration(version, name, data=None):
+    def register(func):
+        MIGRATIONS.append((version, name, func, data))
+        return func
+    return register
+
+
+def index_exists(table, name):
+    return any(index.name == name for index in db.get_indexes(table))
+
+
+def add_index(model, columns):
+    """Создать индекс, если его ещё нет.
+
+    Имя строится так же, как у индексов peewee, поэтому индекс, созданный
+    через Meta.indexes при create_tables, не дублируется. В MySQL индекс
+    строится онлайн (ALGORITHM=INPLACE, LOCK=NONE): таблица остаётся
+    доступной на чтение и запись.
+    """
+    table = model._meta.table_name
+    name = '_'.join([table] + columns)
+    if index_exists(table, name):
+        return
+    column_list = ', '.join(db.quote(column) for column in columns)
+    if isinstance(db, MySQLDatabase):
+        db.execute_sql(f"ALTER TABLE {db.quote(table)} ADD INDEX {db.quote(name)} ({column_list}), "
+                       f"ALGORITHM=INPLACE, LOCK=NONE")
+    else:
+        db.execute_sql(f"CREATE INDEX IF NOT EXISTS {db.quote(name)} ON {db.quote(table)} ({column_list})")
+
+
+@migration(1, 'initial_schema')
+def initial_schema():
+    # Для баз, загруженных из дампа, таблицы уже есть и пропускаются
+    db.create_tables([Hotel, RoomType, Room, Guest, Booking, RoomNight], safe=True)
+
+
+@migration(2, 'query_indexes')
+def query_indexes():
+    add_index(Booking, ['room_id', 'check_in_date', 'check_out_date'])
+    add_index(Hotel, ['city'])
+    add_index(Room, ['hotel_id', 'is_available'])
+    add_index(Guest, ['email'])
+
+
+def bookings_exist():
+    return Booking.select().exists()
+
+
+@migration(3, 'room_night_backfill', data=bookings_exist)
+def room_night_backfill():
+    # Брони, созданные до появления реестра ночей: поиск свободных
+    # номеров читает только room_night
+    from reservations import rebuild_room_nights
+    rebuild_room_nights()
+
+
+@migration(4, 'guest_search_indexes')
+def guest_search_indexes():
+    # Поиск гостей по префиксу: по индексу на каждое поле
+    add_index(Guest, ['first_name'])
+    add_index(Guest, ['last_name'])
+    add_index(Guest, ['phone'])
+
+
+def latest_version():
+    return max(version for version, _, _, _ in MIGRATIONS)
+
+
+def current_version():
+    """Номер последней применённой миграции; 0, если таблицы версий нет"""
+    try:
+        return SchemaVersion.select(fn.MAX(SchemaVersion.version)).scalar() or 0
+    except (OperationalError, ProgrammingError):
+        return 0
+
+
+@contextmanager
+def migration_lock():
+    """Не даёт нескольким процессам применять миграции одновременно"""
+    if not isinstance(db, MySQLDatabase):
+        yield
+        return
+    acquired = db.execute_sql("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK, MIGRATION_LOCK_TIMEOUT)).fetchone()[0]
+    if acquired != 1:
+        raise RuntimeError("Timed out waiting for the schema migration lock")
+    try:
+        yield
+    finally:
+        db.execute_sql("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+
+
+def migrate(target=None, data=True):
+    """Применить миграции новее текущей версии, вернуть их номера.
+
+    data=False — остановиться перед первой миграцией данных, которой
+    есть что переписывать.
+    """
+    applied = []
+    with migration_lock():
+        db.create_tables([SchemaVersion], safe=True)
+        # Версия читается под блокировкой: другой процесс мог уже всё применить
+        version = current_version()
+        for number, name, func, has_data in sorted(MIGRATIONS, key=lambda item: item[0]):
+            if number <= version or (target is not None and number > target):
+                continue
+            if has_data is not None and not data and has_data():
+                break
+            with db.atomic():
+                func()
+                SchemaVersion.create(version=number, name=name)
+            applied.append(number)
+    return applied
+
+
+def check_schema():
+    """Проверка схемы при запуске: если она актуальна, это один SELECT"""
+    version = current_version()
+    latest = latest_version()
+    if version >= latest:
+        return version
+    if not MIGRATE_ON_STARTUP:
+        raise RuntimeError(f"Database schema is at version {version}, code expects {latest}: "
+                           f"run python migrations.py")
+    # Блокировка миграций держится всё время применения: долгая миграция
+    # данных задержала бы запуск всех воркеров
+    applied = migrate(data=False)
+    version = max(applied, default=version)
+    if version < latest:
+        number, name = next((number, name) for number, name, _, _ in sorted(MIGRATIONS, key=lambda item: item[0])
+                            if number > version)
+        raise RuntimeError(f"Database schema is at version {version}, code expects {latest}: "
+                           f"data migration {number} ({name}) is not run on startup, run python migrations.py")
+    return latest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Database schema migrations")
+    parser.add_argument('--status', action='store_true', help="show schema versions and exit")
+    parser.add_argument('--target', type=int, help="apply migrations up to this version")
+    args = parser.parse_args(argv)
+
+    with db.connection_context():
+        if args.status:
+            print(f"current: {current_version()}, latest: {latest_version()}")
+            return
+        applied = migrate(args.target)
+    if applied:
+        print(f"Applied migrations: {', '.join(map(str, applied))}")
+    else:
+        print("Schema is up to date")
+
+
+if __name__ == "__main__":
+    main()
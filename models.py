@@ -1,5 +1,5 @@
 # models.py
-from peewee import Model, AutoField, CharField, IntegerField, FloatField, ForeignKeyField, DateField
+from peewee import Model, AutoField, CharField, IntegerField, FloatField, ForeignKeyField, DateField, CompositeKey
 from database import db
 
 class BaseModel(Model):
@@ -10,7 +10,7 @@ class Hotel(BaseModel):
     id = AutoField()
     name = CharField()
     address = CharField()
-    city = CharField()
+    city = CharField(index=True)
     rating = FloatField()
 
 class RoomType(BaseModel):
@@ -27,12 +27,18 @@ class Room(BaseModel):
     price_per_night = FloatField()
     is_available = IntegerField(default=1)
 
+    class Meta:
+        indexes = (
+            # Свободные номера отеля
+            (('hotel', 'is_available'), False),
+        )
+
 class Guest(BaseModel):
     id = AutoField()
-    first_name = CharField()
-    last_name = CharField()
-    email = CharField()
-    phone = CharField()
+    first_name = CharField(index=True)
+    last_name = CharField(index=True)
+    email = CharField(index=True)
+    phone = CharField(index=True)
 
 class Booking(BaseModel):
     id = AutoField()
@@ -41,4 +47,24 @@ class Booking(BaseModel):
     check_in_date = DateField()
     check_out_date = DateField()
     total_price = FloatField()
-    status = CharField(default='confirmed')
\ No newline at end of file
+    status = CharField(default='confirmed')
+
+    class Meta:
+        indexes = (
+            # Поиск пересекающихся бронирований номера по датам
+            (('room', 'check_in_date', 'check_out_date'), False),
+        )
+
+class RoomNight(BaseModel):
+    """Реестр занятых ночей: одна строка на номер и дату заезда ночи.
+
+    Первичный ключ (room, night) не даёт двум бронированиям занять
+    одну и ту же ночь одного номера.
+    """
+    room = ForeignKeyField(Room, backref='nights')
+    night = DateField()
+    booking = ForeignKeyField(Booking, backref='nights')
+
+    class Meta:
+        table_name = 'room_night'
+        primary_key = CompositeKey('room', 'night')
\ No newline at end of file
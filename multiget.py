@@ -0,0 +1,50 @@
+# multiget.py
+"""Получение записей списком id: GET /hotels/?ids=3,1,2.
+
+Ответ — список в порядке запрошенных id, на месте отсутствующей записи
+null. Id читаются запросами IN пачками по MULTIGET_BATCH_SIZE, так что
+страница из тысячи бронирований получает своих гостей и номера за пару
+запросов вместо тысячи.
+"""
+from typing import Optional
+from fastapi import HTTPException, Query
+from peewee import chunked
+
+MULTIGET_MAX_IDS = 5000
+MULTIGET_BATCH_SIZE = 1000
+
+
+class IdsParams:
+    """Параметр ids: id через запятую; None, если параметр не передан"""
+
+    def __init__(self, ids: Optional[str] = Query(None, description="comma-separated ids, e.g. 3,1,2")):
+        self.ids = None
+        if ids is None:
+            return
+        try:
+            self.ids = [int(value) for value in ids.split(',') if value.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+        if len(self.ids) > MULTIGET_MAX_IDS:
+            raise HTTPException(status_code=413, detail=f"Too many ids, maximum is {MULTIGET_MAX_IDS}")
+
+
+def in_order(rows_by_id, ids):
+    return [rows_by_id.get(object_id) for object_id in ids]
+
+
+def fetch_ids(query, id_field, ids):
+    """Строки запроса-словаря по списку id в порядке ids"""
+    rows = {}
+    for batch in chunked(set(ids), MULTIGET_BATCH_SIZE):
+        rows.update((row['id'], row) for row in query.where(id_field.in_(batch)))
+    return in_order(rows, ids)
+
+
+async def afetch_ids(query, id_field, ids):
+    """То же, что fetch_ids, через асинхронный драйвер"""
+    from async_db import adb
+    rows = {}
+    for batch in chunked(set(ids), MULTIGET_BATCH_SIZE):
+        rows.update((row['id'], row) for row in await adb.fetch_all(query.where(id_field.in_(batch))))
+    return in_order(rows, ids)
@@ -0,0 +1,43 @@
+# pagination.py
+from typing import Optional
+from fastapi import Query, Response
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+class PageParams:
+    """Параметры keyset-пагинации: after — id последней записи прошлой страницы"""
+
+    def __init__(self,
+                 after: Optional[int] = Query(None, ge=0),
+                 limit: int = Query(DEFAULT_LIMIT, ge=1, le=MAX_LIMIT)):
+        self.after = after
+        self.limit = limit
+
+
+def paginate(query, id_field, page: PageParams, response: Response):
+    """Вернуть одну страницу запроса, упорядоченного по id.
+
+    Выбирается limit + 1 строка: лишняя строка только сигнализирует,
+    что есть следующая страница, и в ответ не попадает. Курсор следующей
+    страницы отдаётся в заголовке X-Next-Cursor.
+    """
+    if page.after is not None:
+        query = query.where(id_field > page.after)
+    rows = list(query.order_by(id_field).limit(page.limit + 1))
+    return page_of(rows, page, response)
+
+
+def page_of(rows, page: PageParams, response: Response):
+    """Обрезать выборку из limit + 1 строк до страницы и выставить курсор.
+
+    Строки — экземпляры моделей или словари с ключом 'id'.
+    """
+    if len(rows) > page.limit:
+        rows = rows[:page.limit]
+        last = rows[-1]
+        last_id = last['id'] if isinstance(last, dict) else last.id
+        response.headers[NEXT_CURSOR_HEADER] = str(last_id)
+    return rows
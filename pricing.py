@@ -0,0 +1,117 @@
+# pricing.py
+"""Расчёт стоимости проживания по цене номера за ночь.
+
+Цена ночи = Room.price_per_night * сезонный множитель месяца
+* множитель выходных (ночи с пятницы и субботы). Сумма ночей
+уменьшается на скидку за длительность проживания. Расчёт векторный:
+множители ночей календаря считаются один раз на весь диапазон дат
+пакета, а сумма множителей каждого проживания берётся как разность
+накопленных сумм, поэтому стоимость не зависит от числа ночей.
+
+numpy импортируется при первом расчёте, а не при загрузке модуля:
+импорт занимает заметную часть холодного старта воркера.
+"""
+import os
+from fastapi import HTTPException
+from peewee import chunked
+from models import Room
+from reservations import MAX_STAY_NIGHTS
+
+# Множители цены по месяцам, январь — первый
+SEASON_MULTIPLIERS = (1.0, 1.0, 1.0, 1.0, 1.1, 1.25, 1.3, 1.3, 1.1, 1.0, 1.0, 1.2)
+WEEKEND_MULTIPLIER = float(os.environ.get('PRICING_WEEKEND_MULTIPLIER', 1.2))
+# Ночи с пятницы на субботу и с субботы на воскресенье (понедельник — 0)
+WEEKEND_NIGHTS = (4, 5)
+# Скидки за длительность: (от скольких ночей, доля скидки), по возрастанию
+STAY_DISCOUNTS = ((7, 0.05), (14, 0.10), (28, 0.20))
+
+QUOTE_MAX_ITEMS = 10000
+LOOKUP_BATCH_SIZE = 1000
+
+
+def to_days(values):
+    """Массив дат datetime64[D] из строк YYYY-MM-DD или date"""
+    import numpy as np
+    try:
+        return np.asarray(values, dtype='datetime64[D]')
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+
+
+def check_stays(check_ins, check_outs):
+    import numpy as np
+    nights = (check_outs - check_ins).astype(np.int64)
+    if np.any(nights <= 0):
+        raise HTTPException(status_code=400, detail="check_out_date must be after check_in_date")
+    if np.any(nights > MAX_STAY_NIGHTS):
+        raise HTTPException(status_code=400, detail=f"Stay is longer than {MAX_STAY_NIGHTS} nights")
+    return nights
+
+
+def night_multipliers(first, last):
+    """Множители ночей календаря [first, last)"""
+    import numpy as np
+    days = np.arange(first, last, dtype='datetime64[D]')
+    # 1970-01-01 — четверг
+    weekdays = (days.astype(np.int64) + 3) % 7
+    months = days.astype('datetime64[M]').astype(np.int64) % 12
+    multipliers = np.asarray(SEASON_MULTIPLIERS)[months]
+    return np.where(np.isin(weekdays, WEEKEND_NIGHTS), multipliers * WEEKEND_MULTIPLIER, multipliers)
+
+
+def stay_discounts(nights):
+    import numpy as np
+    discounts = np.zeros(nights.shape)
+    for min_nights, discount in STAY_DISCOUNTS:
+        discounts[nights >= min_nights] = discount
+    return discounts
+
+
+def quote(prices, check_ins, check_outs):
+    """Стоимость проживаний; аргументы — массивы одной длины или скаляры.
+
+    Возвращает массивы: число ночей, сумма без скидки, скидка, итог.
+    """
+    import numpy as np
+    check_ins = to_days(check_ins)
+    check_outs = to_days(check_outs)
+    prices, check_ins, check_outs = np.broadcast_arrays(np.asarray(prices, dtype=float), check_ins, check_outs)
+    nights = check_stays(check_ins, check_outs)
+    if not nights.size:
+        return nights, prices, prices, prices
+    first = check_ins.min()
+    cumulative = np.concatenate(([0.0], np.cumsum(night_multipliers(first, check_outs.max()))))
+    start = (check_ins - first).astype(np.int64)
+    end = (check_outs - first).astype(np.int64)
+    subtotals = np.round(prices * (cumulative[end] - cumulative[start]), 2)
+    discounts = stay_discounts(nights)
+    totals = np.round(subtotals * (1 - discounts), 2)
+    return nights, subtotals, discounts, totals
+
+
+def room_prices(room_ids):
+    """Цены номеров по id одним запросом IN на пачку; 422, если номера нет"""
+    wanted = set(room_ids)
+    prices = {}
+    for batch in chunked(wanted, LOOKUP_BATCH_SIZE):
+        query = Room.select(Room.id, Room.price_per_night).where(Room.id.in_(batch)).tuples()
+        prices.update(query)
+    missing = sorted(wanted - set(prices))
+    if missing:
+        raise HTTPException(status_code=422, detail={'message': "Room not found", 'missing_ids': missing})
+    return prices
+
+
+def booking_price(room_id, check_in, check_out):
+    """Итоговая стоимость одного проживания"""
+    prices = room_prices([room_id])
+    return float(quote(prices[room_id], check_in, check_out)[3])
+
+
+async def abooking_price(room_id, check_in, check_out):
+    """То же, что booking_price, но цена номера читается через асинхронный драйвер"""
+    from async_db import adb
+    row = await adb.fetch_one(Room.select(Room.price_per_night).where(Room.id == room_id))
+    if row is None:
+        raise HTTPException(status_code=422, detail={'message': "Room not found", 'missing_ids': [room_id]})
+    return float(quote(row['price_per_night'], check_in, check_out)[3])
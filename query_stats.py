@@ -0,0 +1,119 @@
+# query_stats.py
+"""Учёт SQL-запросов на один HTTP-запрос.
+
+Перехватчик execute_sql базы (database.py) и асинхронного драйвера
+(async_db.py) вызывает record(), которая добавляет запрос к счётчику
+текущего HTTP-запроса. Счётчик лежит в contextvar: синхронные
+эндпоинты выполняются в threadpool с копией контекста, поэтому видят
+тот же объект. Middleware отдаёт итог в заголовках X-DB-Queries
+и X-DB-Time-ms и копит сводку по маршрутам для /stats/queries.
+"""
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+QUERIES_HEADER = 'X-DB-Queries'
+TIME_HEADER = 'X-DB-Time-ms'
+
+
+class QueryStats:
+    __slots__ = ('queries', 'time')
+
+    def __init__(self):
+        self.queries = 0
+        self.time = 0.0
+
+    @property
+    def time_ms(self):
+        return round(self.time * 1000, 3)
+
+
+_current = ContextVar('query_stats', default=None)
+
+
+def record(elapsed):
+    """Учесть выполненный запрос в счётчике текущего HTTP-запроса"""
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.time += elapsed
+
+
+@contextmanager
+def count_queries():
+    """Считать запросы внутри блока: with count_queries() as stats: ..."""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+class RouteQueryTotals:
+    """Сводка по маршрутам: число запросов API, SQL-запросов и время БД"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def add(self, route, stats):
+        with self._lock:
+            totals = self._routes.get(route)
+            if totals is None:
+                totals = self._routes[route] = {'requests': 0, 'queries': 0, 'max_queries': 0, 'db_time': 0.0}
+            totals['requests'] += 1
+            totals['queries'] += stats.queries
+            totals['max_queries'] = max(totals['max_queries'], stats.queries)
+            totals['db_time'] += stats.time
+
+    def snapshot(self):
+        with self._lock:
+            return {route: {
+                'requests': totals['requests'],
+                'queries': totals['queries'],
+                'max_queries': totals['max_queries'],
+                'avg_queries': round(totals['queries'] / totals['requests'], 2),
+                'db_time_ms': round(totals['db_time'] * 1000, 3),
+                'avg_db_time_ms': round(totals['db_time'] * 1000 / totals['requests'], 3),
+            } for route, totals in sorted(self._routes.items())}
+
+    def clear(self):
+        with self._lock:
+            self._routes.clear()
+
+
+route_totals = RouteQueryTotals()
+
+
+def route_label(scope):
+    """Шаблон маршрута (GET /hotels/{hotel_id}), чтобы id не плодили ключи"""
+    route = scope.get('route')
+    path = getattr(route, 'path', None) or 'unmatched'
+    return f"{scope['method']} {path}"
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware: счётчик запросов к БД на каждый HTTP-запрос"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((QUERIES_HEADER.lower().encode(), str(stats.queries).encode()))
+                headers.append((TIME_HEADER.lower().encode(), str(stats.time_ms).encode()))
+                message = dict(message, headers=headers)
+            await send(message)
+
+        with count_queries() as stats:
+            try:
+                await self.app(scope, receive, send_with_headers)
+            finally:
+                route_totals.add(route_label(scope), stats)
@@ -0,0 +1,255 @@
+# reservations.py
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+from datetime import date, timedelta
+from fastapi import HTTPException
+from peewee import IntegrityError, chunked
+from database import db
+from models import Booking, RoomNight
+from availability import INACTIVE_STATUSES
+from bulk import bulk_insert
+
+# Ограничение длины проживания: реестр хранит строку на каждую ночь
+MAX_STAY_NIGHTS = 366
+LEDGER_BATCH_SIZE = 1000
+
+ROOM_TAKEN = "Room is already booked for these dates"
+ROOM_BUSY = "Room is being booked by another request, retry later"
+
+# InnoDB: deadlock и превышение ожидания блокировки. Обычный случай —
+# несколько транзакций ждут одну ночь, а державшая её откатывается
+LOCK_ERRORS = (1213, 1205)
+# Сколько раз повторить транзакцию брони после такой ошибки, прежде чем ответить 409
+LOCK_RETRIES = int(os.environ.get('BOOKING_LOCK_RETRIES', 3))
+# Начальная пауза перед повтором, секунды; дальше удваивается, со случайным разбросом
+LOCK_RETRY_DELAY = float(os.environ.get('BOOKING_LOCK_RETRY_DELAY', 0.01))
+
+
+def parse_stay(check_in, check_out):
+    """Даты заезда и выезда как date с проверкой диапазона"""
+    try:
+        if not isinstance(check_in, date):
+            check_in = date.fromisoformat(check_in)
+        if not isinstance(check_out, date):
+            check_out = date.fromisoformat(check_out)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    if check_out <= check_in:
+        raise HTTPException(status_code=400, detail="check_out_date must be after check_in_date")
+    if (check_out - check_in).days > MAX_STAY_NIGHTS:
+        raise HTTPException(status_code=400, detail=f"Stay is longer than {MAX_STAY_NIGHTS} nights")
+    return check_in, check_out
+
+
+def occupies_room(status):
+    return status not in INACTIVE_STATUSES
+
+
+def night_rows(booking_id, room_id, check_in, check_out):
+    """Строки реестра для ночей [check_in, check_out)"""
+    return [{'room': room_id, 'night': check_in + timedelta(days=offset), 'booking': booking_id}
+            for offset in range((check_out - check_in).days)]
+
+
+def hold_nights(rows):
+    """Занять ночи в реестре.
+
+    Проверки «свободно ли» нет: конкурирующие вставки одной ночи
+    упираются в первичный ключ, и проигравшая получает IntegrityError.
+    Блокируются только записи индекса этих ночей, поэтому брони разных
+    номеров и разных дат друг друга не ждут.
+    """
+    try:
+        with db.atomic():
+            for batch in chunked(rows, LEDGER_BATCH_SIZE):
+                RoomNight.insert_many(batch).execute()
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail=ROOM_TAKEN)
+
+
+def is_lock_error(exc):
+    # peewee, pymysql и aiomysql объявляют собственные классы OperationalError
+    return type(exc).__name__ == 'OperationalError' and bool(exc.args) and exc.args[0] in LOCK_ERRORS
+
+
+def retry_delay(attempt):
+    return random.uniform(0, LOCK_RETRY_DELAY * 2 ** attempt)
+
+
+def atomic_with_retry(func):
+    """Выполнить func() в транзакции, повторяя её после deadlock и таймаута блокировки.
+
+    InnoDB откатывает такую транзакцию целиком, поэтому повторяется вся
+    транзакция, а внутри чужой транзакции ошибка передаётся наружу.
+    Если повторы кончились, ответ 409: номер бронируют другие запросы.
+    """
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            with db.atomic():
+                return func()
+        except Exception as exc:
+            if not is_lock_error(exc) or db.in_transaction():
+                raise
+            if attempt == LOCK_RETRIES:
+                raise HTTPException(status_code=409, detail=ROOM_BUSY)
+            time.sleep(retry_delay(attempt))
+
+
+def release_nights(booking_id):
+    RoomNight.delete().where(RoomNight.booking == booking_id).execute()
+
+
+def create_booking(guest_id, room_id, check_in, check_out, total_price, status):
+    """Создать бронирование и занять его ночи в одной транзакции"""
+    check_in, check_out = parse_stay(check_in, check_out)
+
+    def create():
+        booking = Booking.create(guest=guest_id, room=room_id, check_in_date=check_in,
+                                 check_out_date=check_out, total_price=total_price, status=status)
+        if occupies_room(status):
+            hold_nights(night_rows(booking.id, room_id, check_in, check_out))
+        return booking
+    return atomic_with_retry(create)
+
+
+def create_bookings(items):
+    """Создать пачку бронирований; конфликт любой из них отменяет всю пачку.
+
+    items — словари с полями модели Booking.
+    """
+    for item in items:
+        item['check_in_date'], item['check_out_date'] = parse_stay(item['check_in_date'],
+                                                                   item['check_out_date'])
+
+    def create():
+        ids = bulk_insert(Booking, items)
+        nights = []
+        for booking_id, item in zip(ids, items):
+            if occupies_room(item['status']):
+                nights.extend(night_rows(booking_id, item['room'],
+                                         item['check_in_date'], item['check_out_date']))
+        hold_nights(nights)
+        return ids
+    return atomic_with_retry(create)
+
+
+def update_booking(booking, guest_id, room_id, check_in, check_out, total_price, status):
+    """Изменить бронирование и пересобрать его ночи в одной транзакции"""
+    check_in, check_out = parse_stay(check_in, check_out)
+
+    def update():
+        release_nights(booking.id)
+        booking.guest = guest_id
+        booking.room = room_id
+        booking.check_in_date = check_in
+        booking.check_out_date = check_out
+        booking.total_price = total_price
+        booking.status = status
+        booking.save()
+        if occupies_room(status):
+            hold_nights(night_rows(booking.id, room_id, check_in, check_out))
+        return booking
+    return atomic_with_retry(update)
+
+
+def delete_booking(booking):
+    with db.atomic():
+        release_nights(booking.id)
+        booking.delete_instance()
+
+
+def rebuild_room_nights(room_ids=None):
+    """Пересобрать реестр ночей из таблицы бронирований.
+
+    Нужна после загрузки дампа или ручной правки броней в обход API.
+    Брони читаются по номерам в порядке заезда; если в данных уже есть
+    пересекающиеся брони одного номера, ночь достаётся более ранней,
+    а id остальных возвращаются в conflicts. Реестр заменяется в одной
+    транзакции, поэтому поиск не видит его пустым.
+    """
+    bookings = (Booking
+                .select(Booking.id, Booking.room, Booking.check_in_date, Booking.check_out_date)
+                .where(Booking.status.not_in(INACTIVE_STATUSES))
+                .order_by(Booking.room, Booking.check_in_date, Booking.id)
+                .tuples())
+    ledger = RoomNight.delete()
+    if room_ids is not None:
+        room_ids = list(room_ids)
+        bookings = bookings.where(Booking.room.in_(room_ids))
+        ledger = ledger.where(RoomNight.room.in_(room_ids))
+
+    result = {'bookings': 0, 'nights': 0, 'conflicts': []}
+    batch = []
+    current_room, taken = None, set()
+    with db.atomic():
+        ledger.execute()
+        for booking_id, room_id, check_in, check_out in bookings.iterator():
+            if room_id != current_room:
+                current_room, taken = room_id, set()
+            rows = [row for row in night_rows(booking_id, room_id, check_in, check_out) if row['night'] not in taken]
+            if len(rows) < (check_out - check_in).days:
+                result['conflicts'].append(booking_id)
+            taken.update(row['night'] for row in rows)
+            batch.extend(rows)
+            result['bookings'] += 1
+            result['nights'] += len(rows)
+            if len(batch) >= LEDGER_BATCH_SIZE:
+                RoomNight.insert_many(batch).execute()
+                batch = []
+        if batch:
+            RoomNight.insert_many(batch).execute()
+    result['conflicts'].sort()
+    return result
+
+
+def is_integrity_error(exc):
+    # sqlite3 и pymysql объявляют собственные классы IntegrityError
+    return type(exc).__name__ == 'IntegrityError'
+
+
+async def acreate_booking(guest_id, room_id, check_in, check_out, total_price, status):
+    """create_booking через асинхронный драйвер; возвращает id бронирования"""
+    from async_db import adb
+    check_in, check_out = parse_stay(check_in, check_out)
+    for attempt in range(LOCK_RETRIES + 1):
+        try:
+            async with adb.transaction() as conn:
+                booking_id = await conn.execute(Booking.insert(
+                    guest=guest_id, room=room_id, check_in_date=check_in, check_out_date=check_out,
+                    total_price=total_price, status=status))
+                if occupies_room(status):
+                    rows = night_rows(booking_id, room_id, check_in, check_out)
+                    for batch in chunked(rows, LEDGER_BATCH_SIZE):
+                        await conn.execute(RoomNight.insert_many(batch))
+            return booking_id, check_in, check_out
+        except Exception as exc:
+            if is_integrity_error(exc):
+                raise HTTPException(status_code=409, detail=ROOM_TAKEN)
+            if not is_lock_error(exc):
+                raise
+            if attempt == LOCK_RETRIES:
+                raise HTTPException(status_code=409, detail=ROOM_BUSY)
+            await asyncio.sleep(retry_delay(attempt))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Room-night ledger maintenance")
+    parser.add_argument('command', choices=['rebuild'], help="re-derive room_night from booking")
+    parser.add_argument('--room', type=int, action='append', dest='rooms',
+                        help="rebuild only this room; may be repeated")
+    args = parser.parse_args(argv)
+
+    with db.connection_context():
+        result = rebuild_room_nights(args.rooms)
+    print(f"Rebuilt {result['nights']} nights from {result['bookings']} bookings")
+    if result['conflicts']:
+        print(f"Overlapping bookings left without nights: {result['conflicts']}", file=sys.stderr)
+    return result
+
+
+if __name__ == "__main__":
+    main()
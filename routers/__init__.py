@@ -3,5 +3,9 @@ from .room_types import app as room_types_router
 from .rooms import app as rooms_router
 from .guests import app as guests_router
 from .bookings import app as bookings_router
+from .async_api import app as async_router
+from .quotes import app as quotes_router
+from .jobs import app as jobs_router
 
-__all__ = ['hotels_router', 'room_types_router', 'rooms_router', 'guests_router', 'bookings_router']
\ No newline at end of file
+__all__ = ['hotels_router', 'room_types_router', 'rooms_router', 'guests_router', 'bookings_router',
+           'async_router', 'quotes_router', 'jobs_router']
\ No newline at end of file
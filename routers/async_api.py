@@ -0,0 +1,140 @@
+# routers/async_api.py
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
+from async_db import adb
+from models import Hotel, Room, Guest, Booking
+from pagination import PageParams, page_of
+from multiget import IdsParams, afetch_ids, in_order
+from etag import conditional
+from serializers import FieldsParams, hotel_serializer, room_type_serializer, room_serializer, guest_serializer, \
+    booking_serializer, json_response, project
+from availability import SearchParams, describe_rooms
+from cache import hotel_cache, room_type_cache
+from routers.bookings import BookingCreate
+from reservations import acreate_booking
+from pricing import abooking_price
+
+# Асинхронные версии самых нагруженных эндпоинтов: запросы идут
+# через асинхронный драйвер и не занимают потоки threadpool
+app = APIRouter(prefix="/async", tags=["async"])
+
+
+async def fetch_by_id(serializer, object_id, fields, detail):
+    row = await adb.fetch_one(serializer.select(fields).where(serializer.model.id == object_id))
+    if row is None:
+        raise HTTPException(status_code=404, detail=detail)
+    return row
+
+
+async def fetch_page(query, id_field, page: PageParams, response: Response):
+    if page.after is not None:
+        query = query.where(id_field > page.after)
+    rows = await adb.fetch_all(query.order_by(id_field).limit(page.limit + 1))
+    return page_of(rows, page, response)
+
+
+@app.get("/hotels/")
+async def get_hotels(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+                     fields: FieldsParams = Depends()):
+    only = hotel_serializer.only(fields)
+    if ids.ids is not None:
+        rows = [project(row, only) for row in in_order(await hotel_cache.aget_many(ids.ids), ids.ids)]
+    else:
+        rows = await fetch_page(hotel_serializer.select(only), Hotel.id, page, response)
+    return conditional(request, response, rows) or json_response(rows, response)
+
+@app.get("/hotels/{hotel_id}")
+async def get_hotel(hotel_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    only = hotel_serializer.only(fields)
+    hotel = project((await hotel_cache.aget_many([hotel_id])).get(hotel_id), only)
+    if hotel is None:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+    return conditional(request, response, hotel) or json_response(hotel, response)
+
+@app.get("/room_types/{room_type_id}")
+async def get_room_type(room_type_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    only = room_type_serializer.only(fields)
+    room_type = project((await room_type_cache.aget_many([room_type_id])).get(room_type_id), only)
+    if room_type is None:
+        raise HTTPException(status_code=404, detail="Room type not found")
+    return conditional(request, response, room_type) or json_response(room_type, response)
+
+@app.get("/rooms/")
+async def get_rooms(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+                    fields: FieldsParams = Depends()):
+    only = room_serializer.only(fields)
+    if ids.ids is not None:
+        rows = await afetch_ids(room_serializer.select(only), Room.id, ids.ids)
+    else:
+        rows = await fetch_page(room_serializer.select(only), Room.id, page, response)
+    return conditional(request, response, rows) or json_response(rows, response)
+
+@app.get("/rooms/search/available_rooms")
+async def search_available_rooms(request: Request,
+                                 response: Response,
+                                 search: SearchParams = Depends(),
+                                 page: PageParams = Depends()):
+    """Поиск номеров, свободных на даты [check_in, check_out)"""
+    rooms = await fetch_page(search.query(), Room.id, page, response)
+    hotels = await hotel_cache.aget_many(room['hotel_id'] for room in rooms)
+    room_types = await room_type_cache.aget_many(room['room_type_id'] for room in rooms)
+    not_modified = conditional(request, response, (rooms, sorted(hotels.items()), sorted(room_types.items()),
+                                                   search.check_in, search.check_out))
+    if not_modified:
+        return not_modified
+    return json_response(describe_rooms(rooms, hotels, room_types, search.totals(rooms)), response)
+
+@app.get("/rooms/{room_id}")
+async def get_room(room_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    row = await fetch_by_id(room_serializer, room_id, room_serializer.only(fields), "Room not found")
+    return conditional(request, response, row) or json_response(row, response)
+
+@app.get("/guests/")
+async def get_guests(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+                     fields: FieldsParams = Depends()):
+    only = guest_serializer.only(fields)
+    if ids.ids is not None:
+        rows = await afetch_ids(guest_serializer.select(only), Guest.id, ids.ids)
+    else:
+        rows = await fetch_page(guest_serializer.select(only), Guest.id, page, response)
+    return conditional(request, response, rows) or json_response(rows, response)
+
+@app.get("/guests/{guest_id}")
+async def get_guest(guest_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    row = await fetch_by_id(guest_serializer, guest_id, guest_serializer.only(fields), "Guest not found")
+    return conditional(request, response, row) or json_response(row, response)
+
+@app.get("/bookings/")
+async def get_bookings(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+                       fields: FieldsParams = Depends()):
+    only = booking_serializer.only(fields)
+    if ids.ids is not None:
+        rows = await afetch_ids(booking_serializer.select(only), Booking.id, ids.ids)
+    else:
+        rows = await fetch_page(booking_serializer.select(only), Booking.id, page, response)
+    return conditional(request, response, rows) or json_response(rows, response)
+
+@app.get("/bookings/{booking_id}")
+async def get_booking(booking_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    row = await fetch_by_id(booking_serializer, booking_id, booking_serializer.only(fields), "Booking not found")
+    return conditional(request, response, row) or json_response(row, response)
+
+@app.post("/bookings/")
+async def create_booking(booking: BookingCreate):
+    total_price = await abooking_price(booking.room_id, booking.check_in_date, booking.check_out_date)
+    booking_id, check_in, check_out = await acreate_booking(
+        booking.guest_id,
+        booking.room_id,
+        booking.check_in_date,
+        booking.check_out_date,
+        total_price,
+        booking.status
+    )
+    return json_response({
+        'id': booking_id,
+        'guest_id': booking.guest_id,
+        'room_id': booking.room_id,
+        'check_in_date': check_in,
+        'check_out_date': check_out,
+        'total_price': total_price,
+        'status': booking.status
+    })
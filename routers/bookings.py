@@ -1,17 +1,27 @@
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
-from models import Booking 
+from database import DatabaseRoute
+from models import Booking, Guest
 from schemas import BookingCreate  
+from pagination import PageParams, paginate
+from multiget import IdsParams, fetch_ids
+from etag import conditional
+from serializers import FieldsParams, booking_serializer, json_response
+from bulk import check_bulk_size, check_references
+import reservations
+import pricing
 from datetime import date
 
-app = APIRouter(prefix="/bookings", tags=["bookings"])
+app = APIRouter(prefix="/bookings", tags=["bookings"], route_class=DatabaseRoute)
 
 class BookingCreate(BaseModel):
     guest_id: int
     room_id: int
     check_in_date: str
     check_out_date: str
-    total_price: float
+    # Стоимость считает сервер (pricing.py); поле оставлено для старых клиентов и не используется
+    total_price: Optional[float] = None
     status: str
 
 class BookingUpdate(BaseModel):
@@ -20,78 +30,77 @@ class BookingUpdate(BaseModel):
     room_id: int
     check_in_date: str
     check_out_date: str
-    total_price: float
+    total_price: Optional[float] = None
     status: str
 
 @app.get('/')
-def get_bookings():
-    bookings = Booking.select()
-    return [{
-        'id': booking.id,
-        'guest_id': booking.guest.id,
-        'room_id': booking.room.id,
-        'check_in_date': booking.check_in_date,
-        'check_out_date': booking.check_out_date,
-        'total_price': booking.total_price,
-        'status': booking.status
-    } for booking in bookings]
+def get_bookings(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+                 fields: FieldsParams = Depends()):
+    only = booking_serializer.only(fields)
+    if ids.ids is not None:
+        bookings = fetch_ids(booking_serializer.select(only), Booking.id, ids.ids)
+    else:
+        bookings = paginate(booking_serializer.select(only), Booking.id, page, response)
+    return conditional(request, response, bookings) or json_response(bookings, response)
 
 @app.get('/{booking_id}')
-def get_booking(booking_id: int):
-    try:
-        booking = Booking.get(Booking.id == booking_id)
-        return {
-            'id': booking.id,
-            'guest_id': booking.guest.id,
-            'room_id': booking.room.id,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'total_price': booking.total_price,
-            'status': booking.status
-        }
-    except Booking.DoesNotExist:
+def get_booking(booking_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    booking = booking_serializer.get(booking_id, booking_serializer.only(fields))
+    if booking is None:
         raise HTTPException(status_code=404, detail="Booking not found")
+    return conditional(request, response, booking) or json_response(booking, response)
 
 @app.post('/')
 def create_booking(booking: BookingCreate):
-    booking = Booking.create(
-        guest=booking.guest_id,
-        room=booking.room_id,
-        check_in_date=booking.check_in_date,
-        check_out_date=booking.check_out_date,
-        total_price=booking.total_price,
-        status=booking.status
+    # Занятость номера проверяет реестр ночей: пересечение даёт 409
+    total_price = pricing.booking_price(booking.room_id, booking.check_in_date, booking.check_out_date)
+    booking = reservations.create_booking(
+        booking.guest_id,
+        booking.room_id,
+        booking.check_in_date,
+        booking.check_out_date,
+        total_price,
+        booking.status
     )
-    return {
-        'id': booking.id,
-        'guest_id': booking.guest.id,
-        'room_id': booking.room.id,
+    return json_response(booking_serializer.dump(booking))
+
+@app.post('/bulk')
+def create_bookings_bulk(bookings: List[BookingCreate]):
+    """Создать бронирования пачкой в одной транзакции"""
+    check_bulk_size(bookings)
+    check_references(Guest, [booking.guest_id for booking in bookings], "Guest not found")
+    prices = pricing.room_prices(booking.room_id for booking in bookings)
+    totals = pricing.quote(
+        [prices[booking.room_id] for booking in bookings],
+        [booking.check_in_date for booking in bookings],
+        [booking.check_out_date for booking in bookings]
+    )[3]
+    ids = reservations.create_bookings([{
+        'guest': booking.guest_id,
+        'room': booking.room_id,
         'check_in_date': booking.check_in_date,
         'check_out_date': booking.check_out_date,
-        'total_price': booking.total_price,
+        'total_price': float(total_price),
         'status': booking.status
-    }
+    } for booking, total_price in zip(bookings, totals)])
+    return {'ids': ids}
 
 @app.put('/')
 def update_booking(booking_update: BookingUpdate):
     try:
         booking = Booking.get(Booking.id == booking_update.id)
-        booking.guest = booking_update.guest_id
-        booking.room = booking_update.room_id
-        booking.check_in_date = booking_update.check_in_date
-        booking.check_out_date = booking_update.check_out_date
-        booking.total_price = booking_update.total_price
-        booking.status = booking_update.status
-        booking.save()
-        return {
-            'id': booking.id,
-            'guest_id': booking.guest.id,
-            'room_id': booking.room.id,
-            'check_in_date': booking.check_in_date,
-            'check_out_date': booking.check_out_date,
-            'total_price': booking.total_price,
-            'status': booking.status
-        }
+        total_price = pricing.booking_price(booking_update.room_id, booking_update.check_in_date,
+                                            booking_update.check_out_date)
+        reservations.update_booking(
+            booking,
+            booking_update.guest_id,
+            booking_update.room_id,
+            booking_update.check_in_date,
+            booking_update.check_out_date,
+            total_price,
+            booking_update.status
+        )
+        return json_response(booking_serializer.dump(booking))
     except Booking.DoesNotExist:
         raise HTTPException(status_code=404, detail="Booking not found")
 
@@ -99,7 +108,7 @@ def update_booking(booking_update: BookingUpdate):
 def delete_booking(booking_id: int):
     try:
         booking = Booking.get(Booking.id == booking_id)
-        booking.delete_instance()
+        reservations.delete_booking(booking)
         return {"message": "Booking deleted successfully"}
     except Booking.DoesNotExist:
         raise HTTPException(status_code=404, detail="Booking not found")
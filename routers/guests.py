@@ -1,9 +1,18 @@
-from fastapi import APIRouter, HTTPException
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response, Query
 from pydantic import BaseModel
+from database import DatabaseRoute
 from models import Guest
 from schemas import GuestCreate
+from pagination import PageParams, paginate
+from multiget import IdsParams, fetch_ids
+from etag import conditional
+from serializers import FieldsParams, guest_serializer, json_response
+from bulk import check_bulk_size, bulk_insert
+from cascade import cascade_delete
+from guest_search import SEARCH_DEFAULT_LIMIT, SEARCH_MAX_LIMIT, search_guests
 
-app = APIRouter(prefix="/guests", tags=["guests"])
+app = APIRouter(prefix="/guests", tags=["guests"], route_class=DatabaseRoute)
 
 class GuestCreate(BaseModel):
     first_name: str
@@ -19,29 +28,27 @@ class GuestUpdate(BaseModel):
     phone: str
 
 @app.get("/")
-def get_guests():
-    guests = Guest.select()
-    return [{
-        'id': guest.id,
-        'first_name': guest.first_name,
-        'last_name': guest.last_name,
-        'email': guest.email,
-        'phone': guest.phone
-    } for guest in guests]
+def get_guests(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+               fields: FieldsParams = Depends()):
+    only = guest_serializer.only(fields)
+    if ids.ids is not None:
+        guests = fetch_ids(guest_serializer.select(only), Guest.id, ids.ids)
+    else:
+        guests = paginate(guest_serializer.select(only), Guest.id, page, response)
+    return conditional(request, response, guests) or json_response(guests, response)
+
+@app.get("/search")
+def search(q: str = Query(..., min_length=1, max_length=100),
+           limit: int = Query(SEARCH_DEFAULT_LIMIT, ge=1, le=SEARCH_MAX_LIMIT)):
+    """Поиск гостя по началу имени, фамилии, email или телефона"""
+    return json_response(search_guests(q, limit))
 
 @app.get("/{guest_id}")
-def get_guest(guest_id: int):
-    try:
-        guest = Guest.get(Guest.id == guest_id)
-        return {
-            'id': guest.id,
-            'first_name': guest.first_name,
-            'last_name': guest.last_name,
-            'email': guest.email,
-            'phone': guest.phone
-        }
-    except Guest.DoesNotExist:
+def get_guest(guest_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    guest = guest_serializer.get(guest_id, guest_serializer.only(fields))
+    if guest is None:
         raise HTTPException(status_code=404, detail="Guest not found")
+    return conditional(request, response, guest) or json_response(guest, response)
 
 @app.post("/")
 def create_guest(guest: GuestCreate):
@@ -51,13 +58,19 @@ def create_guest(guest: GuestCreate):
         email=guest.email,
         phone=guest.phone
     )
-    return {
-        'id': guest.id,
+    return json_response(guest_serializer.dump(guest))
+
+@app.post("/bulk")
+def create_guests_bulk(guests: List[GuestCreate]):
+    """Создать гостей пачкой в одной транзакции"""
+    check_bulk_size(guests)
+    ids = bulk_insert(Guest, [{
         'first_name': guest.first_name,
         'last_name': guest.last_name,
         'email': guest.email,
         'phone': guest.phone
-    }
+    } for guest in guests])
+    return {'ids': ids}
 
 @app.put("/")
 def update_guest(guest_update: GuestUpdate):
@@ -68,21 +81,11 @@ def update_guest(guest_update: GuestUpdate):
         guest.email = guest_update.email
         guest.phone = guest_update.phone
         guest.save()
-        return {
-            'id': guest.id,
-            'first_name': guest.first_name,
-            'last_name': guest.last_name,
-            'email': guest.email,
-            'phone': guest.phone
-        }
+        return json_response(guest_serializer.dump(guest))
     except Guest.DoesNotExist:
         raise HTTPException(status_code=404, detail="Guest not found")
 
 @app.delete('/{guest_id}')
-def delete_guest(guest_id: int):
-    try:
-        guest = Guest.get(Guest.id == guest_id)
-        guest.delete_instance()
-        return {"message": "Guest deleted successfully"}
-    except Guest.DoesNotExist:
-        raise HTTPException(status_code=404, detail="Guest not found")
+def delete_guest(guest_id: int, dry_run: bool = False, background: bool = False):
+    """Удалить гостя с его бронями; dry_run — только посчитать"""
+    return cascade_delete(Guest, guest_id, "Guest not found", "Guest deleted successfully", dry_run, background)
@@ -1,10 +1,21 @@
 # routers/hotels.py
-from fastapi import APIRouter, HTTPException
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
+from database import DatabaseRoute
 from models import Hotel, Room
 from schemas import HotelCreate
+from pagination import PageParams, paginate
+from multiget import IdsParams, in_order
+from etag import conditional
+from serializers import FieldsParams, hotel_serializer, room_serializer, json_response, project
+from bulk import check_bulk_size, bulk_insert
+from cache import hotel_cache, room_type_cache
+from analytics import AnalyticsParams, hotel_analytics
+from hotel_search import HotelSearchParams, hotel_search
+from cascade import cascade_delete
 
-app = APIRouter(prefix="/hotels", tags=["hotels"])
+app = APIRouter(prefix="/hotels", tags=["hotels"], route_class=DatabaseRoute)
 
 class HotelCreate(BaseModel):
     name: str
@@ -20,29 +31,34 @@ class HotelUpdate(BaseModel):
     rating: float
 
 @app.get("/")
-def get_hotels():
-    hotels = Hotel.select()
-    return [{
-        'id': hotel.id,
-        'name': hotel.name,
-        'address': hotel.address,
-        'city': hotel.city,
-        'rating': hotel.rating
-    } for hotel in hotels]
+def get_hotels(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+               fields: FieldsParams = Depends()):
+    only = hotel_serializer.only(fields)
+    if ids.ids is not None:
+        hotels = [project(hotel, only) for hotel in in_order(hotel_cache.get_many(ids.ids), ids.ids)]
+    else:
+        hotels = paginate(hotel_serializer.select(only), Hotel.id, page, response)
+    return conditional(request, response, hotels) or json_response(hotels, response)
+
+@app.get("/search")
+def search_hotels(params: HotelSearchParams = Depends()):
+    """Поиск отелей по городу, рейтингу и цене номера с фасетами по городу и рейтингу"""
+    result = hotel_search.index().search(params)
+    hotels = hotel_cache.get_many(hotel_id for hotel_id, _ in result['page'])
+    return json_response({
+        'total': result['total'],
+        'hotels': [dict(hotels[hotel_id], min_price=price)
+                   for hotel_id, price in result['page'] if hotel_id in hotels],
+        'facets': result['facets']
+    })
 
 @app.get("/{hotel_id}")
-def get_hotel(hotel_id: int):
-    try:
-        hotel = Hotel.get(Hotel.id == hotel_id)
-        return {
-            'id': hotel.id,
-            'name': hotel.name,
-            'address': hotel.address,
-            'city': hotel.city,
-            'rating': hotel.rating
-        }
-    except Hotel.DoesNotExist:
+def get_hotel(hotel_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    only = hotel_serializer.only(fields)
+    hotel = project(hotel_cache.get_one(hotel_id), only)
+    if hotel is None:
         raise HTTPException(status_code=404, detail="Hotel not found")
+    return conditional(request, response, hotel) or json_response(hotel, response)
 
 @app.post("/")
 def create_hotel(hotel: HotelCreate):
@@ -52,13 +68,21 @@ def create_hotel(hotel: HotelCreate):
         city=hotel.city,
         rating=hotel.rating
     )
-    return {
-        'id': hotel.id,
+    hotel_search.invalidate()
+    return json_response(hotel_serializer.dump(hotel))
+
+@app.post("/bulk")
+def create_hotels_bulk(hotels: List[HotelCreate]):
+    """Создать отели пачкой в одной транзакции"""
+    check_bulk_size(hotels)
+    ids = bulk_insert(Hotel, [{
         'name': hotel.name,
         'address': hotel.address,
         'city': hotel.city,
         'rating': hotel.rating
-    }
+    } for hotel in hotels])
+    hotel_search.invalidate()
+    return {'ids': ids}
 
 @app.put("/")
 def update_hotel(hotel_update: HotelUpdate):
@@ -69,38 +93,42 @@ def update_hotel(hotel_update: HotelUpdate):
         hotel.city = hotel_update.city
         hotel.rating = hotel_update.rating
         hotel.save()
-        
-        return {
-            'id': hotel.id,
-            'name': hotel.name,
-            'address': hotel.address,
-            'city': hotel.city,
-            'rating': hotel.rating
-        }
+        hotel_cache.invalidate(hotel.id)
+        hotel_search.invalidate()
+        return json_response(hotel_serializer.dump(hotel))
     except Hotel.DoesNotExist:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
 @app.delete("/{hotel_id}")
-def delete_hotel(hotel_id: int):
-    try:
-        hotel = Hotel.get(Hotel.id == hotel_id)
-        hotel.delete_instance()
-        return {"message": "Hotel deleted successfully"}
-    except Hotel.DoesNotExist:
-        raise HTTPException(status_code=404, detail="Hotel not found")
-    
+def delete_hotel(hotel_id: int, dry_run: bool = False, background: bool = False):
+    """Удалить отель с номерами и бронями; dry_run — только посчитать"""
+    def invalidate():
+        hotel_cache.invalidate(hotel_id)
+        hotel_search.invalidate()
+    return cascade_delete(Hotel, hotel_id, "Hotel not found", "Hotel deleted successfully",
+                          dry_run, background, after=invalidate)
+
 @app.get('/{hotel_id}/rooms')
-def get_hotel_rooms(hotel_id: int):
+def get_hotel_rooms(hotel_id: int, request: Request, response: Response, page: PageParams = Depends()):
     """Получить все номера конкретного отеля"""
-    try:
-        hotel = Hotel.get(Hotel.id == hotel_id)
-        rooms = Room.select().where(Room.hotel == hotel)
-        return [{
-            'id': room.id,
-            'room_type': room.room_type.name,
-            'room_number': room.room_number,
-            'price_per_night': room.price_per_night,
-            'is_available': room.is_available
-        } for room in rooms]
-    except Hotel.DoesNotExist:
-        raise HTTPException(status_code=404, detail="Hotel not found")
\ No newline at end of file
+    if hotel_cache.get_one(hotel_id) is None:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+    rooms = paginate(room_serializer.select().where(Room.hotel == hotel_id), Room.id, page, response)
+    room_types = room_type_cache.get_many(room['room_type_id'] for room in rooms)
+    not_modified = conditional(request, response, (rooms, sorted(room_types.items())))
+    if not_modified:
+        return not_modified
+    return json_response([{
+        'id': room['id'],
+        'room_type': room_types[room['room_type_id']]['name'],
+        'room_number': room['room_number'],
+        'price_per_night': room['price_per_night'],
+        'is_available': room['is_available']
+    } for room in rooms], response)
+
+@app.get('/{hotel_id}/analytics')
+def get_hotel_analytics(hotel_id: int, period: AnalyticsParams = Depends()):
+    """Загрузка, ADR и RevPAR отеля по дням периода [from, to)"""
+    if hotel_cache.get_one(hotel_id) is None:
+        raise HTTPException(status_code=404, detail="Hotel not found")
+    return json_response(hotel_analytics(hotel_id, period.first, period.last))
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, HTTPException
+from jobs import jobs
+
+app = APIRouter(prefix="/jobs", tags=["jobs"])
+
+@app.get("/{job_id}")
+def get_job(job_id: str):
+    """Статус и прогресс фонового задания"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
@@ -0,0 +1,36 @@
+from typing import List
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel
+from database import DatabaseRoute
+from pricing import QUOTE_MAX_ITEMS, quote, room_prices
+from serializers import json_response
+
+app = APIRouter(prefix="/quotes", tags=["quotes"], route_class=DatabaseRoute)
+
+class QuoteRequest(BaseModel):
+    room_id: int
+    check_in_date: str
+    check_out_date: str
+
+@app.post('/')
+def create_quotes(items: List[QuoteRequest]):
+    """Стоимость проживаний пачкой: одна выборка цен и один векторный расчёт"""
+    if not items:
+        raise HTTPException(status_code=400, detail="Empty quote request")
+    if len(items) > QUOTE_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Too many items, maximum is {QUOTE_MAX_ITEMS}")
+    prices = room_prices(item.room_id for item in items)
+    nights, subtotals, discounts, totals = quote(
+        [prices[item.room_id] for item in items],
+        [item.check_in_date for item in items],
+        [item.check_out_date for item in items]
+    )
+    return json_response([{
+        'room_id': item.room_id,
+        'check_in_date': item.check_in_date,
+        'check_out_date': item.check_out_date,
+        'nights': int(nights[i]),
+        'subtotal': float(subtotals[i]),
+        'discount': float(discounts[i]),
+        'total_price': float(totals[i])
+    } for i, item in enumerate(items)])
@@ -1,10 +1,18 @@
 # routers/room_types.py
-from fastapi import APIRouter, HTTPException
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
+from database import DatabaseRoute
 from models import RoomType
 from schemas import RoomTypeCreate
+from pagination import PageParams, paginate
+from multiget import IdsParams, in_order
+from etag import conditional
+from serializers import FieldsParams, room_type_serializer, json_response, project
+from bulk import check_bulk_size, bulk_insert
+from cache import room_type_cache
 
-app = APIRouter(prefix="/room_types", tags=["room_types"])
+app = APIRouter(prefix="/room_types", tags=["room_types"], route_class=DatabaseRoute)
 
 class RoomTypesCreate(BaseModel):
     name: str
@@ -18,27 +26,22 @@ class RoomTypesUpdate(BaseModel):
     capacity: int
 
 @app.get("/")
-def get_room_types():
-    room_types = RoomType.select()
-    return [{
-        'id': rt.id,
-        'name': rt.name,
-        'description': rt.description,
-        'capacity': rt.capacity
-    } for rt in room_types]
+def get_room_types(request: Request, response: Response, page: PageParams = Depends(),
+                   ids: IdsParams = Depends(), fields: FieldsParams = Depends()):
+    only = room_type_serializer.only(fields)
+    if ids.ids is not None:
+        room_types = [project(room_type, only) for room_type in in_order(room_type_cache.get_many(ids.ids), ids.ids)]
+    else:
+        room_types = paginate(room_type_serializer.select(only), RoomType.id, page, response)
+    return conditional(request, response, room_types) or json_response(room_types, response)
 
 @app.get("/{room_type_id}")
-def get_room_type(room_type_id: int):
-    try:
-        room_type = RoomType.get(RoomType.id == room_type_id)
-        return {
-            'id': room_type.id,
-            'name': room_type.name,
-            'description': room_type.description,
-            'capacity': room_type.capacity
-        }
-    except RoomType.DoesNotExist:
+def get_room_type(room_type_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    only = room_type_serializer.only(fields)
+    room_type = project(room_type_cache.get_one(room_type_id), only)
+    if room_type is None:
         raise HTTPException(status_code=404, detail="Room type not found")
+    return conditional(request, response, room_type) or json_response(room_type, response)
 
 @app.post("/")
 def create_room_type(room_types: RoomTypesCreate):
@@ -47,12 +50,18 @@ def create_room_type(room_types: RoomTypesCreate):
         description=room_types.description,
         capacity=room_types.capacity
     )
-    return {
-        'id': room_type.id,
-        'name': room_type.name,
-        'description': room_type.description,
-        'capacity': room_type.capacity
-    }
+    return json_response(room_type_serializer.dump(room_type))
+
+@app.post("/bulk")
+def create_room_types_bulk(room_types: List[RoomTypesCreate]):
+    """Создать типы номеров пачкой в одной транзакции"""
+    check_bulk_size(room_types)
+    ids = bulk_insert(RoomType, [{
+        'name': rt.name,
+        'description': rt.description,
+        'capacity': rt.capacity
+    } for rt in room_types])
+    return {'ids': ids}
 
 @app.put("/")
 def update_room_type(room_type_update: RoomTypesUpdate):
@@ -62,12 +71,8 @@ def update_room_type(room_type_update: RoomTypesUpdate):
         room_type.description = room_type_update.description
         room_type.capacity = room_type_update.capacity
         room_type.save()
-        return {
-            'id': room_type.id,
-            'name': room_type.name,
-            'description': room_type.description,
-            'capacity': room_type.capacity
-        }
+        room_type_cache.invalidate(room_type.id)
+        return json_response(room_type_serializer.dump(room_type))
     except RoomType.DoesNotExist:
         raise HTTPException(status_code=404, detail="Room type not found")
 
@@ -76,6 +81,7 @@ def delete_room_type(room_type_id: int):
     try:
         room_type = RoomType.get(RoomType.id == room_type_id)
         room_type.delete_instance()
+        room_type_cache.invalidate(room_type.id)
         return {"message": "Room type deleted successfully"}
     except RoomType.DoesNotExist:
         raise HTTPException(status_code=404, detail="Room type not found")
\ No newline at end of file
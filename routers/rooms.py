@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException
+from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Request, Response
 from pydantic import BaseModel
-from models import Room, Hotel
+from database import DatabaseRoute
+from models import Room, Hotel, RoomType
 from schemas import RoomCreate
+from pagination import PageParams, paginate
+from multiget import IdsParams, fetch_ids
+from etag import conditional
+from serializers import FieldsParams, room_serializer, json_response
+from availability import SearchParams, describe_rooms
+from cache import hotel_cache, room_type_cache
+from hotel_search import hotel_search
+from cascade import cascade_delete
+from bulk import check_bulk_size, check_references, bulk_insert
 
-app = APIRouter(prefix="/rooms", tags=["rooms"])
+app = APIRouter(prefix="/rooms", tags=["rooms"], route_class=DatabaseRoute)
 
 class RoomCreate(BaseModel):
     hotel_id: int
@@ -21,31 +32,21 @@ class RoomUpdate(BaseModel):
     is_available: int
 
 @app.get("/")
-def get_rooms():
-    rooms = Room.select()
-    return [{
-        'id': room.id,
-        'hotel_id': room.hotel.id,
-        'room_type_id': room.room_type.id,
-        'room_number': room.room_number,
-        'price_per_night': room.price_per_night,
-        'is_available': room.is_available
-    } for room in rooms]
+def get_rooms(request: Request, response: Response, page: PageParams = Depends(), ids: IdsParams = Depends(),
+              fields: FieldsParams = Depends()):
+    only = room_serializer.only(fields)
+    if ids.ids is not None:
+        rooms = fetch_ids(room_serializer.select(only), Room.id, ids.ids)
+    else:
+        rooms = paginate(room_serializer.select(only), Room.id, page, response)
+    return conditional(request, response, rooms) or json_response(rooms, response)
 
 @app.get('/{room_id}')
-def get_room(room_id: int):
-    try:
-        room = Room.get(Room.id == room_id)
-        return {
-            'id': room.id,
-            'hotel_id': room.hotel.id,
-            'room_type_id': room.room_type.id,
-            'room_number': room.room_number,
-            'price_per_night': room.price_per_night,
-            'is_available': room.is_available
-        }
-    except Room.DoesNotExist:
+def get_room(room_id: int, request: Request, response: Response, fields: FieldsParams = Depends()):
+    room = room_serializer.get(room_id, room_serializer.only(fields))
+    if room is None:
         raise HTTPException(status_code=404, detail="Room not found")
+    return conditional(request, response, room) or json_response(room, response)
 
 @app.post('/')
 def create_room(room: RoomCreate):
@@ -55,14 +56,24 @@ def create_room(room: RoomCreate):
         room_number=room.room_number,
         price_per_night=room.price_per_night
     )
-    return {
-        'id': room.id,
-        'hotel_id': room.hotel.id,
-        'room_type_id': room.room_type.id,
+    hotel_search.invalidate()
+    return json_response(room_serializer.dump(room))
+
+@app.post('/bulk')
+def create_rooms_bulk(rooms: List[RoomCreate]):
+    """Создать номера пачкой в одной транзакции"""
+    check_bulk_size(rooms)
+    check_references(Hotel, [room.hotel_id for room in rooms], "Hotel not found")
+    check_references(RoomType, [room.room_type_id for room in rooms], "Room type not found")
+    ids = bulk_insert(Room, [{
+        'hotel': room.hotel_id,
+        'room_type': room.room_type_id,
         'room_number': room.room_number,
         'price_per_night': room.price_per_night,
         'is_available': room.is_available
-    }
+    } for room in rooms])
+    hotel_search.invalidate()
+    return {'ids': ids}
 
 @app.put('/')
 def update_room(room_update: RoomUpdate):
@@ -76,37 +87,29 @@ def update_room(room_update: RoomUpdate):
         room.is_available = room_update.is_available  # добавьте эту строку
         
         room.save()
-        
-        return {
-            'id': room.id,
-            'hotel_id': room.hotel.id,
-            'room_type_id': room.room_type.id,
-            'room_number': room.room_number,
-            'price_per_night': room.price_per_night,
-            'is_available': room.is_available
-        }
+        hotel_search.invalidate()
+        return json_response(room_serializer.dump(room))
     except Room.DoesNotExist:
         raise HTTPException(status_code=404, detail="Room not found")
     
 @app.delete('/{room_id}')
-def delete_room(room_id: int):
-    try:
-        room = Room.get(Room.id == room_id)
-        room.delete_instance()
-        return {"message": "Room deleted successfully"}
-    except Room.DoesNotExist:
-        raise HTTPException(status_code=404, detail="Room not found")
+def delete_room(room_id: int, dry_run: bool = False, background: bool = False):
+    """Удалить номер с его бронями; dry_run — только посчитать"""
+    return cascade_delete(Room, room_id, "Room not found", "Room deleted successfully",
+                          dry_run, background, after=hotel_search.invalidate)
 
 @app.get('/search/available_rooms')
-def search_available_rooms():
-    """Поиск доступных номеров"""
-    available_rooms = Room.select().where(Room.is_available == 1)
-    return [{
-        'id': room.id,
-        'hotel_name': room.hotel.name,
-        'room_type': room.room_type.name,
-        'room_number': room.room_number,
-        'price_per_night': room.price_per_night,
-        'capacity': room.room_type.capacity
-    } for room in available_rooms]
+def search_available_rooms(request: Request,
+                           response: Response,
+                           search: SearchParams = Depends(),
+                           page: PageParams = Depends()):
+    """Поиск номеров, свободных на даты [check_in, check_out)"""
+    rooms = paginate(search.query().dicts(), Room.id, page, response)
+    hotels = hotel_cache.get_many(room['hotel_id'] for room in rooms)
+    room_types = room_type_cache.get_many(room['room_type_id'] for room in rooms)
+    not_modified = conditional(request, response, (rooms, sorted(hotels.items()), sorted(room_types.items()),
+                                                   search.check_in, search.check_out))
+    if not_modified:
+        return not_modified
+    return json_response(describe_rooms(rooms, hotels, room_types, search.totals(rooms)), response)
 
@@ -1,4 +1,5 @@
 # schemas.py
+from typing import Optional
 from pydantic import BaseModel
 
 class HotelCreate(BaseModel):
@@ -29,4 +30,4 @@ class BookingCreate(BaseModel):
     room_id: int
     check_in_date: str
     check_out_date: str
-    total_price: float
\ No newline at end of file
+    total_price: Optional[float] = None
\ No newline at end of file
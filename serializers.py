@@ -0,0 +1,112 @@
+# serializers.py
+"""Сериализация строк моделей в ответы API.
+
+Ключи ответа совпадают с именами колонок (hotel_id, room_type_id и т.д.),
+поэтому выборка с колонками под этими псевдонимами через .dicts() сразу
+даёт тело ответа: экземпляры моделей не создаются, словари не
+пересобираются по полям. Ответ кодируется orjson, если он установлен,
+и возвращается готовым Response, минуя jsonable_encoder FastAPI.
+"""
+import json
+from typing import Optional
+from datetime import date, datetime
+from decimal import Decimal
+from fastapi import HTTPException, Query, Response
+from models import Hotel, RoomType, Room, Guest, Booking
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    # Скаляры numpy из расчёта цен
+    if hasattr(value, 'item'):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    media_type = 'application/json'
+
+    def render(self, content):
+        return dumps(content)
+
+
+def json_response(content, response=None):
+    """Готовый ответ; заголовки (ETag, X-Next-Cursor) переносятся из response эндпоинта"""
+    headers = dict(response.headers) if response is not None else None
+    return FastJSONResponse(content, headers=headers)
+
+
+class FieldsParams:
+    """Параметр fields: нужные поля ответа через запятую (id отдаётся всегда)"""
+
+    def __init__(self, fields: Optional[str] = Query(None, description="comma-separated fields, e.g. id,name,city")):
+        self.fields = None
+        if fields is not None:
+            self.fields = [name.strip() for name in fields.split(',') if name.strip()]
+
+
+class ModelSerializer:
+    """Поля модели под ключами ответа API"""
+
+    def __init__(self, model):
+        self.model = model
+        fields = model._meta.sorted_fields
+        self.columns = [field.alias(field.column_name) for field in fields]
+        self._columns = {field.column_name: column for field, column in zip(fields, self.columns)}
+        # Для внешних ключей id хранится в атрибуте hotel_id, а не hotel
+        self.attributes = tuple((field.column_name, getattr(field, 'object_id_name', field.name))
+                                for field in fields)
+
+    def only(self, params: FieldsParams):
+        """Проверенный список полей ответа или None, если нужны все; 400 на неизвестное поле.
+
+        id добавляется всегда: на нём держатся курсор страницы и ids.
+        """
+        if params.fields is None:
+            return None
+        unknown = [name for name in params.fields if name not in self._columns]
+        if unknown:
+            raise HTTPException(status_code=400, detail={'message': "Unknown fields", 'fields': unknown,
+                                                         'available': list(self._columns)})
+        return list(dict.fromkeys(['id'] + params.fields))
+
+    def select(self, fields=None):
+        """Запрос, строки которого — готовые словари ответа; fields — только эти колонки"""
+        columns = self.columns if fields is None else [self._columns[name] for name in fields]
+        return self.model.select(*columns).dicts()
+
+    def get(self, object_id, fields=None):
+        """Строка по id или None"""
+        return self.select(fields).where(self.model.id == object_id).first()
+
+    def dump(self, instance):
+        """Словарь ответа из экземпляра модели (после create и save)"""
+        return {key: getattr(instance, attribute) for key, attribute in self.attributes}
+
+
+def project(row, fields):
+    """Оставить в готовой строке (например, из кэша) только поля fields"""
+    if row is None or fields is None:
+        return row
+    return {name: row[name] for name in fields}
+
+
+hotel_serializer = ModelSerializer(Hotel)
+room_type_serializer = ModelSerializer(RoomType)
+room_serializer = ModelSerializer(Room)
+guest_serializer = ModelSerializer(Guest)
+booking_serializer = ModelSerializer(Booking)
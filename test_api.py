@@ -53,6 +53,23 @@ class HotelAPITests:
         hotels = response.json()
         assert isinstance(hotels, list)
     
+    def test_hotels_pagination(self):
+        """Тест keyset-пагинации списка отелей"""
+        response = self.session.get(f"{BASE_URL}/hotels", params={"limit": 1})
+        assert response.status_code == 200
+        first_page = response.json()
+        assert len(first_page) <= 1
+        
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if next_cursor:
+            assert int(next_cursor) == first_page[-1]["id"]
+            response = self.session.get(f"{BASE_URL}/hotels", params={"limit": 1, "after": next_cursor})
+            assert response.status_code == 200
+            assert all(hotel["id"] > int(next_cursor) for hotel in response.json())
+        
+        response = self.session.get(f"{BASE_URL}/hotels", params={"limit": 100000})
+        assert response.status_code == 422
+    
     def test_create_hotel(self):
         """Тест создания отеля"""
         hotel_data = {
@@ -502,6 +519,7 @@ def run_api_tests():
         
         # Тесты отелей
         (tester.test_get_hotels, "Получение списка отелей"),
+        (tester.test_hotels_pagination, "Пагинация списка отелей"),
         (tester.test_create_hotel, "Создание отеля"),
         (tester.test_get_single_hotel, "Получение отеля по ID"),
         (tester.test_update_hotel, "Обновление отеля"),
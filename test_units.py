@@ -3,7 +3,17 @@ import sys
 from datetime import date, timedelta
 import re
 from unittest.mock import patch, MagicMock
+import io
 import json
+import os
+import tempfile
+
+from fastapi.testclient import TestClient
+
+# Тесты приложения работают с временной SQLite-базой вместо MySQL
+TEST_DB_DIR = tempfile.TemporaryDirectory()
+os.environ['DB_ENGINE'] = 'sqlite'
+os.environ['DB_NAME'] = os.path.join(TEST_DB_DIR.name, 'test.db')
 
 class TestHotelModels(unittest.TestCase):
     """Тесты моделей данных"""
@@ -648,6 +658,1212 @@ class TestAdditionalScenarios(unittest.TestCase):
         error = response.json()
         self.assertEqual(error['detail'], 'Hotel not found')
 
+def clear_caches():
+    from cache import hotel_cache, room_type_cache
+    from hotel_search import hotel_search
+    
+    hotel_cache.clear()
+    room_type_cache.clear()
+    hotel_search.clear()
+
+class ApiTestCase(unittest.TestCase):
+    """Базовый класс: приложение поверх временной SQLite-базы с тестовыми данными"""
+    
+    ROWS = 20
+    
+    @classmethod
+    def setUpClass(cls):
+        from main import app
+        from database import db
+        from models import Hotel, RoomType, Room, Guest, Booking, RoomNight
+        from reservations import rebuild_room_nights
+        from migrations import migrate
+        cls.db = db
+        cls.models = [Hotel, RoomType, Room, Guest, Booking, RoomNight]
+        with cls.db.connection_context():
+            cls.db.create_tables(cls.models)
+            # Как перед выкладкой: миграции данных на непустой базе
+            # запуск приложения не применяет
+            migrate()
+            room_type = RoomType.create(name='Стандарт', description='Номер', capacity=2)
+            for i in range(cls.ROWS):
+                hotel = Hotel.create(name=f'Отель {i}', address='ул. Тестовая', city='Москва', rating=4.5)
+                room = Room.create(hotel=hotel, room_type=room_type, room_number=str(100 + i), price_per_night=5000)
+                guest = Guest.create(first_name='Иван', last_name='Петров', email=f'g{i}@mail.ru', phone='+79991234567')
+                Booking.create(guest=guest, room=room, check_in_date=date(2024, 3, 1),
+                               check_out_date=date(2024, 3, 5), total_price=20000)
+            rebuild_room_nights()
+        cls.hotel_id = hotel.id
+        cls.client = TestClient(app)
+        clear_caches()
+    
+    @classmethod
+    def tearDownClass(cls):
+        with cls.db.connection_context():
+            cls.db.drop_tables(cls.models)
+    
+    def assertQueryBudget(self, url, budget, method='GET', **kwargs):
+        """Вызвать эндпоинт и упасть, если он выполнил больше budget SQL-запросов"""
+        response = self.client.request(method, url, **kwargs)
+        queries = int(response.headers['X-DB-Queries'])
+        self.assertLessEqual(queries, budget, f"{method} {url}: {queries} запросов при бюджете {budget}")
+        return response
+
+class TestQueryBudget(ApiTestCase):
+    """Тесты числа SQL-запросов на один вызов API"""
+    
+    def assert_query_budget(self, url, budget):
+        response = self.assertQueryBudget(url, budget)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_31_list_endpoints_query_budget(self):
+        """Тест: списки выполняются за фиксированное число запросов"""
+        for url in ['/hotels/', '/room_types/', '/rooms/', '/guests/', '/bookings/']:
+            rows = self.assert_query_budget(url, 1)
+            self.assertEqual(len(rows), self.ROWS if url != '/room_types/' else 1)
+    
+    def test_32_detail_endpoints_query_budget(self):
+        """Тест: получение по ID и номера отеля без N+1"""
+        self.assert_query_budget('/rooms/1', 1)
+        self.assert_query_budget('/bookings/1', 1)
+        
+        clear_caches()
+        rooms = self.assert_query_budget(f'/hotels/{self.hotel_id}/rooms', 3)
+        self.assertEqual(rooms[0]['room_type'], 'Стандарт')
+        self.assert_query_budget(f'/hotels/{self.hotel_id}/rooms', 1)
+    
+    def test_33_search_query_budget(self):
+        """Тест: поиск дочитывает справочники одним запросом на таблицу"""
+        clear_caches()
+        rooms = self.assert_query_budget('/rooms/search/available_rooms', 3)
+        self.assertEqual(len(rooms), self.ROWS)
+        self.assert_query_budget('/rooms/search/available_rooms', 1)
+
+class TestAvailabilitySearch(ApiTestCase):
+    """Тесты поиска свободных номеров по датам"""
+    
+    def search(self, **params):
+        response = self.client.get('/rooms/search/available_rooms', params=params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+    
+    def test_34_overlapping_dates_exclude_room(self):
+        """Тест: номер, занятый на пересекающиеся даты, не найден"""
+        self.assertEqual(self.search(check_in='2024-03-04', check_out='2024-03-06'), [])
+        self.assertEqual(self.search(check_in='2024-02-25', check_out='2024-03-02'), [])
+    
+    def test_35_adjacent_dates_are_free(self):
+        """Тест: день выезда одной брони свободен для заезда следующей"""
+        rooms = self.search(check_in='2024-03-05', check_out='2024-03-07')
+        self.assertEqual(len(rooms), self.ROWS)
+        rooms = self.search(check_in='2024-02-27', check_out='2024-03-01')
+        self.assertEqual(len(rooms), self.ROWS)
+    
+    def test_36_filters(self):
+        """Тест фильтров по городу, вместимости и цене"""
+        dates = {'check_in': '2024-04-01', 'check_out': '2024-04-03'}
+        self.assertEqual(len(self.search(city='Москва', **dates)), self.ROWS)
+        self.assertEqual(self.search(city='Казань', **dates), [])
+        self.assertEqual(self.search(min_capacity=3, **dates), [])
+        self.assertEqual(self.search(max_price=4000, **dates), [])
+        self.assertEqual(len(self.search(min_price=5000, max_price=5000, **dates)), self.ROWS)
+    
+    def test_37_invalid_dates(self):
+        """Тест ошибок при некорректном диапазоне дат"""
+        response = self.client.get('/rooms/search/available_rooms',
+                                   params={'check_in': '2024-03-05', 'check_out': '2024-03-01'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/rooms/search/available_rooms', params={'check_in': '2024-03-05'})
+        self.assertEqual(response.status_code, 400)
+
+class TestConnectionPool(ApiTestCase):
+    """Тесты пула соединений"""
+    
+    def test_38_connection_returned_after_request(self):
+        """Тест: соединение запроса возвращается в пул"""
+        before = self.client.get('/stats/db_pool').json()
+        for _ in range(5):
+            self.assertEqual(self.client.get('/hotels/').status_code, 200)
+        after = self.client.get('/stats/db_pool').json()
+        
+        self.assertEqual(after['in_use'], before['in_use'])
+        self.assertGreaterEqual(after['checkouts'], before['checkouts'] + 5)
+        self.assertLessEqual(after['idle'], after['pool_size'])
+
+    def test_86_pool_keeps_parent_reuse_check(self):
+        """Тест: проверка пула при возврате вызывает проверку peewee и учитывает её ответ"""
+        from database import HotelMySQLDatabase, HotelSqliteDatabase, PoolStatsMixin
+
+        for pool_class in (HotelMySQLDatabase, HotelSqliteDatabase):
+            mro = pool_class.__mro__
+            parent = next(cls for cls in mro[mro.index(PoolStatsMixin) + 1:] if '_can_reuse' in vars(cls))
+            pool = pool_class('unused', pool_size=2)
+            with patch.object(parent, '_can_reuse', return_value=False) as can_reuse:
+                self.assertFalse(pool._can_reuse('conn'))
+            can_reuse.assert_called_once_with('conn')
+            with patch.object(parent, '_can_reuse', return_value=True):
+                self.assertTrue(pool._can_reuse('conn'))
+
+class TestAsyncEndpoints(ApiTestCase):
+    """Тесты асинхронных эндпоинтов"""
+    
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.client.__enter__()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.client.__exit__(None, None, None)
+        super().tearDownClass()
+    
+    def test_39_async_matches_sync(self):
+        """Тест: асинхронные эндпоинты отдают те же данные, что и синхронные"""
+        for url in [f'/hotels/{self.hotel_id}', '/room_types/1', '/rooms/1', '/guests/1', '/bookings/1',
+                    '/hotels/?limit=5', '/rooms/?limit=5&after=3', '/guests/', '/bookings/']:
+            sync_response = self.client.get(url)
+            async_response = self.client.get('/async' + url)
+            self.assertEqual(async_response.status_code, 200, url)
+            self.assertEqual(async_response.json(), sync_response.json(), url)
+            self.assertEqual(async_response.headers.get('X-Next-Cursor'),
+                             sync_response.headers.get('X-Next-Cursor'), url)
+    
+    def test_40_async_search_and_not_found(self):
+        """Тест асинхронного поиска и ответа 404"""
+        params = {'check_in': '2024-03-05', 'check_out': '2024-03-07', 'city': 'Москва'}
+        rooms = self.client.get('/async/rooms/search/available_rooms', params=params).json()
+        self.assertEqual(len(rooms), self.ROWS)
+        self.assertEqual(rooms[0]['hotel_name'], 'Отель 0')
+        
+        response = self.client.get('/async/hotels/999999')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['detail'], 'Hotel not found')
+    
+    def test_41_async_create_booking(self):
+        """Тест создания бронирования через асинхронный эндпоинт"""
+        booking_data = {'guest_id': 1, 'room_id': 1, 'check_in_date': '2024-05-01',
+                        'check_out_date': '2024-05-03', 'total_price': 10000, 'status': 'confirmed'}
+        response = self.client.post('/async/bookings/', json=booking_data)
+        self.assertEqual(response.status_code, 200)
+        booking = response.json()
+        
+        stored = self.client.get(f"/bookings/{booking['id']}").json()
+        self.assertEqual(stored['room_id'], 1)
+        self.assertEqual(stored['check_in_date'], '2024-05-01')
+        self.client.delete(f"/bookings/{booking['id']}")
+
+class TestBulkCreate(ApiTestCase):
+    """Тесты пакетного создания"""
+    
+    def test_42_bulk_create_returns_ids_in_order(self):
+        """Тест: пакетное создание номеров возвращает id в порядке запроса"""
+        rooms = [{'hotel_id': self.hotel_id, 'room_type_id': 1, 'room_number': 500 + i,
+                  'price_per_night': 1000 + i, 'is_available': 1} for i in range(2500)]
+        with patch.object(self.db, 'execute_sql', wraps=self.db.execute_sql) as execute_sql:
+            response = self.client.post('/rooms/bulk', json=rooms)
+        self.assertEqual(response.status_code, 200)
+        ids = response.json()['ids']
+        self.assertEqual(len(ids), len(rooms))
+        # 2 проверки ссылок и 3 многострочных INSERT
+        self.assertLessEqual(execute_sql.call_count, 5)
+        
+        for index in (0, 1234, 2499):
+            room = self.client.get(f'/rooms/{ids[index]}').json()
+            self.assertEqual(room['price_per_night'], 1000 + index)
+    
+    def test_43_bulk_create_rejects_missing_references(self):
+        """Тест: пакет со ссылкой на несуществующий отель не вставляется"""
+        before = len(self.client.get('/bookings/?limit=1000').json())
+        bookings = [{'guest_id': 1, 'room_id': room_id, 'check_in_date': '2024-08-01',
+                     'check_out_date': '2024-08-02', 'total_price': 5000, 'status': 'confirmed'}
+                    for room_id in (1, 2, 999999)]
+        response = self.client.post('/bookings/bulk', json=bookings)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['detail']['missing_ids'], [999999])
+        self.assertEqual(len(self.client.get('/bookings/?limit=1000').json()), before)
+        
+        response = self.client.post('/hotels/bulk', json=[])
+        self.assertEqual(response.status_code, 400)
+
+class TestImporter(ApiTestCase):
+    """Тесты потокового импорта"""
+    
+    def test_44_parse_sql_dump(self):
+        """Тест разбора INSERT из дампа mysqldump"""
+        import importer
+        
+        line = "INSERT INTO `guest` VALUES (1,'Д\\'Артаньян','O''Brien',NULL,-1.5e2),(2,'a,b','(x)','',7);\n"
+        match = importer._INSERT.match(line)
+        rows = list(importer._parse_tuples(line, match.end()))
+        self.assertEqual(match.group(1), 'guest')
+        self.assertEqual(rows, [(1, "Д'Артаньян", "O'Brien", None, -150.0), (2, 'a,b', '(x)', '', 7)])
+        
+        dump = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hotel_booking', 'hotel_booking_booking.sql')
+        rows = list(importer.read_sql_dump(dump))
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(rows[0], ('booking', None, (1, 1, 1, '2024-02-15', '2024-02-20', 22500, 'confirmed')))
+    
+    def test_45_import_csv_and_ndjson(self):
+        """Тест импорта CSV и NDJSON в порядке внешних ключей"""
+        import importer
+        from models import Hotel, Room
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with open(os.path.join(tmpdir, 'room.ndjson'), 'w', encoding='utf-8') as f:
+                for i in range(5):
+                    f.write(json.dumps({'room_number': str(i), 'hotel_id': 1001, 'room_type_id': 1,
+                                        'price_per_night': 100 * i, 'is_available': 1}) + '\n')
+            with open(os.path.join(tmpdir, 'hotel.csv'), 'w', encoding='utf-8') as f:
+                f.write('id,name,address,city,rating\n1001,Импорт,"ул. Новая, 1",Казань,4.1\n')
+            
+            totals = importer.import_files([tmpdir], batch_size=2, out=io.StringIO())
+        
+        self.assertEqual(totals, {'hotel': 1, 'room': 5})
+        with self.db.connection_context():
+            self.assertEqual(Hotel.get_by_id(1001).address, 'ул. Новая, 1')
+            self.assertEqual(Room.select().where(Room.hotel == 1001).count(), 5)
+            Room.delete().where(Room.hotel == 1001).execute()
+            Hotel.delete_by_id(1001)
+
+class TestReferenceCache(ApiTestCase):
+    """Тесты кэша отелей и типов номеров"""
+    
+    def test_46_cache_hits_and_invalidation(self):
+        """Тест: повторное чтение из кэша и сброс записи при обновлении"""
+        url = f'/hotels/{self.hotel_id}'
+        before = self.client.get('/stats/cache').json()['hotels']
+        with patch.object(self.db, 'execute_sql', wraps=self.db.execute_sql) as execute_sql:
+            self.client.get(url)
+            self.client.get(url)
+        self.assertEqual(execute_sql.call_count, 1)
+        after = self.client.get('/stats/cache').json()['hotels']
+        self.assertEqual(after['misses'] - before['misses'], 1)
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        
+        update = {'id': self.hotel_id, 'name': 'Новое имя', 'address': 'ул. Тестовая',
+                  'city': 'Москва', 'rating': 4.9}
+        self.assertEqual(self.client.put('/hotels/', json=update).status_code, 200)
+        self.assertEqual(self.client.get(url).json()['name'], 'Новое имя')
+    
+    def test_47_lru_eviction_and_ttl(self):
+        """Тест вытеснения по размеру и истечения срока записи"""
+        from cache import LRUCache, MISSING
+        
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set(1, 'a')
+        cache.set(2, 'b')
+        cache.get(1)
+        cache.set(3, 'c')
+        self.assertIs(cache.get(2), MISSING)
+        self.assertEqual(cache.get(1), 'a')
+        self.assertEqual(cache.stats()['evictions'], 1)
+        
+        cache = LRUCache(maxsize=2, ttl=0)
+        cache.set(1, 'a')
+        self.assertIs(cache.get(1), MISSING)
+
+class TestConditionalGet(ApiTestCase):
+    """Тесты ETag и If-None-Match"""
+    
+    def test_48_not_modified(self):
+        """Тест: неизменившийся ресурс отдаётся как 304 без тела"""
+        for url in ['/rooms/1', '/room_types/', '/room_types/1', '/guests/?limit=5',
+                    '/rooms/search/available_rooms', '/async/rooms/1']:
+            response = self.client.get(url)
+            etag = response.headers['ETag']
+            response = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response.content, b'', url)
+            self.assertEqual(response.headers['ETag'], etag, url)
+            
+            response = self.client.get(url, headers={'If-None-Match': 'W/"other"'})
+            self.assertEqual(response.status_code, 200, url)
+    
+    def test_49_etag_changes_after_update(self):
+        """Тест: после изменения ресурса старый ETag не совпадает"""
+        url = '/room_types/1'
+        etag = self.client.get(url).headers['ETag']
+        update = {'id': 1, 'name': 'Стандарт', 'description': 'Обновлённый номер', 'capacity': 2}
+        self.assertEqual(self.client.put('/room_types/', json=update).status_code, 200)
+        
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.json()['description'], 'Обновлённый номер')
+
+class TestOverbooking(ApiTestCase):
+    """Тесты защиты от двойного бронирования при конкурентных запросах.
+
+    Тесты идут на SQLite, где пишет одна транзакция за раз, поэтому
+    deadlock и таймауты блокировок InnoDB здесь не возникают: повтор
+    после них проверяет test_87 с подставленными ошибками MySQL.
+    """
+
+    THREADS = 16
+
+    def book_concurrently(self, stays):
+        """Создать брони параллельно, по потоку на бронь; вернуть коды ответов"""
+        import threading
+        import reservations
+        from fastapi import HTTPException
+
+        barrier = threading.Barrier(len(stays))
+        results = [None] * len(stays)
+
+        def book(index, room_id, check_in, check_out):
+            barrier.wait()
+            try:
+                with self.db.connection_context():
+                    reservations.create_booking(1, room_id, check_in, check_out, 1000, 'confirmed')
+                results[index] = 200
+            except HTTPException as exc:
+                results[index] = exc.status_code
+
+        threads = [threading.Thread(target=book, args=(index,) + stay) for index, stay in enumerate(stays)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def active_stays(self, room_id):
+        from models import Booking
+
+        with self.db.connection_context():
+            query = (Booking
+                     .select(Booking.check_in_date, Booking.check_out_date)
+                     .where((Booking.room == room_id) & (Booking.status != 'cancelled'))
+                     .tuples())
+            return [(date.fromisoformat(str(a)), date.fromisoformat(str(b))) for a, b in query]
+
+    def test_50_same_dates_single_winner(self):
+        """Тест: из одновременных броней одного номера на одни даты проходит одна"""
+        stays = [(2, '2025-01-10', '2025-01-13')] * self.THREADS
+        results = self.book_concurrently(stays)
+        self.assertEqual(results.count(200), 1, results)
+        self.assertEqual(results.count(409), self.THREADS - 1, results)
+        self.assertEqual(len(self.active_stays(2)), 2)
+
+    def test_51_overlapping_ranges_never_overlap(self):
+        """Тест: при случайных пересекающихся датах сохранённые брони не пересекаются"""
+        import random
+
+        rng = random.Random(42)
+        start = date(2025, 2, 1)
+        stays = []
+        for _ in range(self.THREADS * 2):
+            check_in = start + timedelta(days=rng.randrange(20))
+            check_out = check_in + timedelta(days=rng.randrange(1, 5))
+            stays.append((3, check_in.isoformat(), check_out.isoformat()))
+        results = self.book_concurrently(stays)
+        self.assertGreaterEqual(results.count(200), 1)
+        self.assertEqual(set(results) - {200, 409}, set())
+
+        created = sorted(stay for stay in self.active_stays(3) if stay[0] >= start)
+        self.assertEqual(len(created), results.count(200))
+        for (_, previous_out), (next_in, _) in zip(created, created[1:]):
+            self.assertLessEqual(previous_out, next_in)
+
+    def test_87_lock_errors_are_retried(self):
+        """Тест: после deadlock транзакция брони повторяется, после исчерпания повторов — 409"""
+        import reservations
+        from peewee import OperationalError
+
+        booking = {'guest_id': 1, 'room_id': 5, 'check_in_date': '2026-06-01',
+                   'check_out_date': '2026-06-03', 'status': 'confirmed'}
+        hold_nights = reservations.hold_nights
+        failures = [OperationalError(1213, 'Deadlock found when trying to get lock')]
+
+        def flaky_hold(rows):
+            if failures:
+                raise failures.pop()
+            return hold_nights(rows)
+
+        with patch.object(reservations, 'LOCK_RETRY_DELAY', 0):
+            with patch('reservations.hold_nights', side_effect=flaky_hold):
+                self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 200)
+            # Брони первой, откаченной попытки не осталось
+            self.assertEqual(self.active_stays(5).count((date(2026, 6, 1), date(2026, 6, 3))), 1)
+
+            stay = dict(booking, check_in_date='2026-07-01', check_out_date='2026-07-03')
+            with patch('reservations.hold_nights', side_effect=OperationalError(1205, 'Lock wait timeout')) as hold:
+                response = self.client.post('/bookings/', json=stay)
+            self.assertEqual(response.status_code, 409)
+            self.assertEqual(response.json()['detail'], reservations.ROOM_BUSY)
+            self.assertEqual(hold.call_count, reservations.LOCK_RETRIES + 1)
+            self.assertNotIn((date(2026, 7, 1), date(2026, 7, 3)), self.active_stays(5))
+
+            # Другие ошибки не повторяются
+            with patch('reservations.hold_nights', side_effect=OperationalError(1064, 'syntax')) as hold:
+                with self.assertRaises(OperationalError):
+                    self.client.post('/bookings/', json=stay)
+            self.assertEqual(hold.call_count, 1)
+
+            # Асинхронная бронь повторяет транзакцию так же
+            from async_db import AsyncConnection
+            execute = AsyncConnection.execute
+            failures.append(OperationalError(1213, 'Deadlock found when trying to get lock'))
+
+            async def flaky_execute(conn, query):
+                if failures and 'room_night' in str(query.sql()[0]):
+                    raise failures.pop()
+                return await execute(conn, query)
+
+            with self.client, patch.object(AsyncConnection, 'execute', flaky_execute):
+                self.assertEqual(self.client.post('/async/bookings/', json=stay).status_code, 200)
+            self.assertEqual(failures, [])
+            self.assertEqual(self.active_stays(5).count((date(2026, 7, 1), date(2026, 7, 3))), 1)
+
+    def test_52_cancel_and_delete_release_nights(self):
+        """Тест: отмена и удаление брони освобождают даты"""
+        booking = {'guest_id': 1, 'room_id': 4, 'check_in_date': '2025-03-01',
+                   'check_out_date': '2025-03-04', 'total_price': 3000, 'status': 'confirmed'}
+        first = self.client.post('/bookings/', json=booking).json()
+        self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 409)
+        self.assertEqual(self.client.post('/async/bookings/', json=booking).status_code, 409)
+
+        self.client.put('/bookings/', json=dict(booking, id=first['id'], status='cancelled'))
+        second = self.client.post('/bookings/', json=booking)
+        self.assertEqual(second.status_code, 200)
+
+        self.client.delete(f"/bookings/{second.json()['id']}")
+        bulk = self.client.post('/bookings/bulk', json=[booking, dict(booking, check_in_date='2025-03-03',
+                                                                      check_out_date='2025-03-06')])
+        self.assertEqual(bulk.status_code, 409)
+        self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 200)
+
+    def test_53_invalid_dates_rejected(self):
+        """Тест: неверные даты отклоняются до записи в базу"""
+        booking = {'guest_id': 1, 'room_id': 5, 'check_in_date': '2025-04-05',
+                   'check_out_date': '2025-04-05', 'total_price': 0, 'status': 'confirmed'}
+        self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 400)
+        booking['check_out_date'] = 'завтра'
+        self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 400)
+        booking['check_out_date'] = '2027-04-05'
+        self.assertEqual(self.client.post('/bookings/', json=booking).status_code, 400)
+
+class TestPricing(ApiTestCase):
+    """Тесты расчёта стоимости проживания"""
+
+    def test_54_vectorized_quote_matches_nightly_sum(self):
+        """Тест: векторный расчёт совпадает с суммой цен по ночам"""
+        import random
+        import pricing
+
+        def nightly_total(price, check_in, check_out):
+            total = 0.0
+            night = check_in
+            while night < check_out:
+                multiplier = pricing.SEASON_MULTIPLIERS[night.month - 1]
+                if night.weekday() in pricing.WEEKEND_NIGHTS:
+                    multiplier *= pricing.WEEKEND_MULTIPLIER
+                total += price * multiplier
+                night += timedelta(days=1)
+            discount = 0.0
+            for min_nights, stay_discount in pricing.STAY_DISCOUNTS:
+                if (check_out - check_in).days >= min_nights:
+                    discount = stay_discount
+            return round(round(total, 2) * (1 - discount), 2)
+
+        rng = random.Random(7)
+        prices, check_ins, check_outs = [], [], []
+        for _ in range(2000):
+            check_in = date(2024, 1, 1) + timedelta(days=rng.randrange(700))
+            prices.append(rng.randrange(1000, 20000))
+            check_ins.append(check_in)
+            check_outs.append(check_in + timedelta(days=rng.randrange(1, 40)))
+        totals = pricing.quote(prices, check_ins, check_outs)[3]
+        for index in range(len(prices)):
+            # Суммы могут расходиться на копейку из-за порядка округления
+            self.assertAlmostEqual(totals[index], nightly_total(prices[index], check_ins[index], check_outs[index]),
+                                   delta=0.011)
+
+    def test_55_quotes_endpoint_and_booking_price(self):
+        """Тест пакетного расчёта и стоимости брони, посчитанной сервером"""
+        quotes = [{'room_id': 1, 'check_in_date': '2024-03-01', 'check_out_date': '2024-03-03'},
+                  {'room_id': 1, 'check_in_date': '2024-03-04', 'check_out_date': '2024-03-11'}]
+        response = self.client.post('/quotes/', json=quotes)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([quote['total_price'] for quote in response.json()], [12000.0, 35150.0])
+        self.assertEqual(response.json()[1]['nights'], 7)
+
+        response = self.client.post('/quotes/', json=[dict(quotes[0], room_id=999999)])
+        self.assertEqual(response.status_code, 422)
+        response = self.client.post('/quotes/', json=[dict(quotes[0], check_out_date='2024-02-01')])
+        self.assertEqual(response.status_code, 400)
+
+        booking = {'guest_id': 1, 'room_id': 6, 'check_in_date': '2025-05-07',
+                   'check_out_date': '2025-05-09', 'total_price': 1, 'status': 'confirmed'}
+        self.assertEqual(self.client.post('/bookings/', json=booking).json()['total_price'], 11000.0)
+
+        rooms = self.client.get('/rooms/search/available_rooms',
+                                params={'check_in': '2025-05-07', 'check_out': '2025-05-09'}).json()
+        self.assertEqual({room['total_price'] for room in rooms}, {11000.0})
+
+class TestMigrations(ApiTestCase):
+    """Тесты версионных миграций схемы"""
+
+    def test_56_migrate_creates_missing_indexes(self):
+        """Тест: миграции создают индексы базы из дампа и записывают версию"""
+        import migrations
+
+        with self.db.connection_context():
+            self.db.drop_tables([migrations.SchemaVersion], safe=True)
+            for name in ('hotel_city', 'guest_email', 'room_hotel_id_is_available'):
+                self.db.execute_sql(f'DROP INDEX "{name}"')
+            self.assertEqual(migrations.current_version(), 0)
+
+            self.assertEqual(migrations.migrate(), [1, 2, 3, 4])
+            self.assertEqual(migrations.migrate(), [])
+            self.assertEqual(migrations.current_version(), migrations.latest_version())
+            self.assertTrue(migrations.index_exists('guest', 'guest_email'))
+
+            plan = self.db.execute_sql('EXPLAIN QUERY PLAN SELECT id FROM hotel WHERE city = ?',
+                                       ('Москва',)).fetchall()
+            self.assertIn('hotel_city', str(plan))
+
+    def test_57_startup_only_reads_version(self):
+        """Тест: при актуальной схеме запуск выполняет один запрос без DDL"""
+        import migrations
+
+        with self.db.connection_context():
+            migrations.migrate()
+            with patch.object(self.db, 'execute_sql', wraps=self.db.execute_sql) as execute_sql:
+                migrations.check_schema()
+            self.assertEqual(execute_sql.call_count, 1)
+            self.assertIn('SELECT', execute_sql.call_args[0][0])
+
+            SchemaVersion = migrations.SchemaVersion
+            latest = migrations.latest_version()
+            SchemaVersion.delete().where(SchemaVersion.version == latest).execute()
+            with patch.object(migrations, 'MIGRATE_ON_STARTUP', False):
+                self.assertRaises(RuntimeError, migrations.check_schema)
+            self.assertEqual(migrations.check_schema(), latest)
+
+    def test_84_startup_refuses_data_migrations(self):
+        """Тест: запуск применяет миграции схемы, но не миграции данных"""
+        import migrations
+
+        with self.db.connection_context():
+            migrations.migrate()
+            SchemaVersion = migrations.SchemaVersion
+            SchemaVersion.delete().where(SchemaVersion.version >= 3).execute()
+            with patch('reservations.rebuild_room_nights') as rebuild:
+                with self.assertRaises(RuntimeError) as error:
+                    migrations.check_schema()
+            rebuild.assert_not_called()
+            self.assertIn('room_night_backfill', str(error.exception))
+            self.assertEqual(migrations.current_version(), 2)
+
+            self.assertEqual(migrations.migrate(), [3, 4])
+            self.assertEqual(migrations.check_schema(), migrations.latest_version())
+
+    def test_85_startup_migrates_empty_database(self):
+        """Тест: запуск на пустой базе без миграций применяет все миграции"""
+        import migrations
+        from main import app
+
+        with self.db.connection_context():
+            self.db.drop_tables(self.models + [migrations.SchemaVersion])
+        with TestClient(app) as client:
+            self.assertEqual(client.get('/hotels/').json(), [])
+        with self.db.connection_context():
+            self.assertEqual(migrations.current_version(), migrations.latest_version())
+
+class TestFastStartup(ApiTestCase):
+    """Тесты быстрого запуска"""
+
+    def test_58_fast_startup_skips_database(self):
+        """Тест: в быстром режиме запуск не открывает соединение с БД"""
+        import main
+
+        with patch.object(main, 'FAST_STARTUP', True), \
+                patch.object(self.db, 'connect', wraps=self.db.connect) as connect:
+            with TestClient(main.app) as client:
+                self.assertEqual(connect.call_count, 0)
+                timings = client.get('/stats/startup').json()
+        self.assertIsNotNone(timings['startup_ms'])
+        self.assertGreater(timings['import_ms'], 0)
+        self.assertGreaterEqual(timings['ready_ms'], timings['import_ms'])
+
+    def test_59_numpy_is_imported_lazily(self):
+        """Тест: numpy не загружается при импорте приложения"""
+        import subprocess
+
+        code = "import sys, main; print('numpy' in sys.modules)"
+        output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout
+        self.assertEqual(output.strip(), 'False')
+
+class TestSerializers(ApiTestCase):
+    """Тесты сериализации ответов"""
+
+    def test_60_dumps_with_and_without_orjson(self):
+        """Тест: orjson и запасной json дают одинаковый JSON"""
+        import numpy as np
+        import serializers
+
+        content = [{'id': 1, 'check_in_date': date(2024, 3, 1), 'total_price': np.float64(1.5), 'name': 'Отель'}]
+        fast = serializers.dumps(content)
+        with patch.object(serializers, 'orjson', None):
+            fallback = serializers.dumps(content)
+        self.assertEqual(json.loads(fast), json.loads(fallback))
+        self.assertEqual(json.loads(fast)[0]['check_in_date'], '2024-03-01')
+
+    def test_61_list_skips_model_instances(self):
+        """Тест: список отдаётся из строк выборки без создания экземпляров моделей"""
+        from models import Booking
+
+        with patch.object(Booking, '__init__', wraps=Booking.__init__, autospec=True) as init:
+            response = self.client.get('/bookings/?limit=2')
+        self.assertEqual(init.call_count, 0)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['content-type'], 'application/json')
+        self.assertEqual(response.headers['X-Next-Cursor'], '2')
+        self.assertEqual(response.json()[0], {
+            'id': 1, 'guest_id': 1, 'room_id': 1, 'check_in_date': '2024-03-01',
+            'check_out_date': '2024-03-05', 'total_price': 20000.0, 'status': 'confirmed'
+        })
+
+        hotel = {'name': 'Новый', 'address': 'ул. Новая', 'city': 'Казань', 'rating': 4.0}
+        created = self.client.post('/hotels/', json=hotel).json()
+        self.assertEqual(created, dict(hotel, id=created['id']))
+        self.assertEqual(self.client.get(f"/hotels/{created['id']}").json(), created)
+
+class TestBenchmark(ApiTestCase):
+    """Тесты нагрузочного бенчмарка"""
+
+    def test_62_seed_and_mixed_load(self):
+        """Тест: бенчмарк заполняет базу и собирает перцентили по маршрутам"""
+        import random
+        import benchmark
+
+        data = benchmark.seed(self.client, hotels=3, rooms_per_hotel=4, guests=10, bookings=30,
+                              rng=random.Random(1))
+        self.assertEqual((len(data.room_ids), len(data.booking_ids)), (12, 30))
+
+        results = benchmark.run_load(lambda: self.client, data, requests=120, concurrency=4)
+        self.assertEqual(results['total']['requests'], 120)
+        self.assertEqual(results['total']['errors'], 0, results['total']['statuses'])
+        self.assertIn('GET /rooms/search/available_rooms', results['routes'])
+        for route in results['routes'].values():
+            self.assertLessEqual(route['p50_ms'], route['p95_ms'])
+            self.assertLessEqual(route['p95_ms'], route['p99_ms'])
+        json.dumps(results)
+
+    def test_63_percentile(self):
+        """Тест перцентиля по ближайшему рангу"""
+        from benchmark import percentile
+
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.95), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+class TestQueryStats(ApiTestCase):
+    """Тесты счётчика SQL-запросов на запрос"""
+
+    def test_64_headers_count_sync_and_async_queries(self):
+        """Тест: заголовки X-DB-Queries и X-DB-Time-ms для синхронных и асинхронных эндпоинтов"""
+        for url in ['/rooms/1', '/async/rooms/1']:
+            response = self.client.get(url)
+            self.assertEqual(response.headers['X-DB-Queries'], '1', url)
+            self.assertGreaterEqual(float(response.headers['X-DB-Time-ms']), 0, url)
+        self.assertEqual(self.client.get('/').headers['X-DB-Queries'], '0')
+
+        with self.assertRaises(AssertionError):
+            clear_caches()
+            self.assertQueryBudget('/rooms/search/available_rooms', 2)
+
+    def test_65_totals_by_route_template(self):
+        """Тест: сводка группирует запросы по шаблону маршрута"""
+        from query_stats import route_totals
+
+        route_totals.clear()
+        for guest_id in (1, 2, 3):
+            self.client.get(f'/guests/{guest_id}')
+        totals = self.client.get('/stats/queries').json()
+        self.assertEqual(totals['GET /guests/{guest_id}']['requests'], 3)
+        self.assertEqual(totals['GET /guests/{guest_id}']['queries'], 3)
+        self.assertEqual(totals['GET /guests/{guest_id}']['max_queries'], 1)
+
+class TestMetrics(ApiTestCase):
+    """Тесты метрик в формате Prometheus"""
+
+    def test_66_histogram_buckets_are_cumulative(self):
+        """Тест: корзины гистограммы накопительные, граница включается в корзину"""
+        from metrics import Histogram
+
+        histogram = Histogram('test_seconds', 'Test', buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            histogram.observe((('route', '/x'),), value)
+        lines = histogram.collect()
+        self.assertIn('test_seconds_bucket{route="/x",le="0.1"} 2', lines)
+        self.assertIn('test_seconds_bucket{route="/x",le="1"} 3', lines)
+        self.assertIn('test_seconds_bucket{route="/x",le="+Inf"} 4', lines)
+        self.assertIn('test_seconds_count{route="/x"} 4', lines)
+        self.assertIn('test_seconds_sum{route="/x"} 3.65', lines)
+
+    def test_67_metrics_endpoint(self):
+        """Тест: /metrics отдаёт счётчики по шаблону маршрута и снимки пула, threadpool и кэша"""
+        import metrics
+
+        metrics.requests_total.clear()
+        metrics.request_latency.clear()
+        self.client.get('/hotels/1')
+        self.client.get('/hotels/2')
+        self.client.get('/hotels/999')
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers['content-type'].startswith('text/plain; version=0.0.4'))
+        lines = response.text.splitlines()
+        self.assertIn('http_requests_total{method="GET",route="/hotels/{hotel_id}",status="200"} 2', lines)
+        self.assertIn('http_requests_total{method="GET",route="/hotels/{hotel_id}",status="404"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/hotels/{hotel_id}"} 3', lines)
+        for name in ('# TYPE db_pool_connections gauge', '# TYPE threadpool_threads_busy gauge',
+                     '# TYPE cache_hits_total counter', '# TYPE db_queries_total counter'):
+            self.assertIn(name, lines)
+
+class TestAnalytics(ApiTestCase):
+    """Тесты отчёта по загрузке и выручке отеля"""
+
+    def test_68_daily_occupancy_adr_revpar(self):
+        """Тест: брони раскладываются по ночам, ночь выезда не считается"""
+        response = self.client.get('/hotels/1/analytics', params={'from': '2024-03-01', 'to': '2024-03-07'})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report['rooms'], 1)
+        self.assertEqual([day['rooms_sold'] for day in report['days']], [1, 1, 1, 1, 0, 0])
+        self.assertEqual(report['days'][0], {'date': '2024-03-01', 'rooms_sold': 1, 'revenue': 5000.0,
+                                             'occupancy': 1.0, 'adr': 5000.0, 'revpar': 5000.0})
+        self.assertIsNone(report['days'][4]['adr'])
+        self.assertEqual(report['summary'], {'room_nights_available': 6, 'room_nights_sold': 4, 'revenue': 20000.0,
+                                             'occupancy': 0.6667, 'adr': 5000.0, 'revpar': 3333.33})
+
+        # Период внутри брони: учитываются только его ночи
+        report = self.client.get('/hotels/1/analytics', params={'from': '2024-03-03', 'to': '2024-03-04'}).json()
+        self.assertEqual(report['summary']['revenue'], 5000.0)
+
+    def test_69_analytics_validation(self):
+        """Тест: неверный период и несуществующий отель"""
+        self.assertEqual(self.client.get('/hotels/1/analytics',
+                                         params={'from': '2024-03-05', 'to': '2024-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/hotels/1/analytics', params={'from': '2024-03-05'}).status_code, 422)
+        self.assertEqual(self.client.get('/hotels/999/analytics',
+                                         params={'from': '2024-03-01', 'to': '2024-03-05'}).status_code, 404)
+
+class TestRoomNightLedger(ApiTestCase):
+    """Тесты пересборки реестра ночей"""
+
+    def test_70_rebuild_from_bookings(self):
+        """Тест: реестр выводится из броней, пересекающаяся бронь попадает в conflicts"""
+        from models import Booking, RoomNight
+        from reservations import rebuild_room_nights
+
+        params = {'check_in': '2026-01-02', 'check_out': '2026-01-03'}
+        with self.db.connection_context():
+            first = Booking.create(guest=1, room=7, check_in_date=date(2026, 1, 1),
+                                   check_out_date=date(2026, 1, 4), total_price=1, status='confirmed')
+            overlapping = Booking.create(guest=2, room=7, check_in_date=date(2026, 1, 3),
+                                         check_out_date=date(2026, 1, 6), total_price=1, status='confirmed')
+            Booking.create(guest=3, room=7, check_in_date=date(2026, 1, 10),
+                           check_out_date=date(2026, 1, 12), total_price=1, status='cancelled')
+        # Брони добавлены в обход API: поиск о них ещё не знает
+        self.assertIn(7, [room['id'] for room in self.client.get('/rooms/search/available_rooms', params=params).json()])
+
+        with self.db.connection_context():
+            result = rebuild_room_nights([7])
+            # Вместе с бронью из тестовых данных; отменённая не учитывается
+            self.assertEqual(result, {'bookings': 3, 'nights': 4 + 3 + 2, 'conflicts': [overlapping.id]})
+            nights = dict(RoomNight.select(RoomNight.night, RoomNight.booking).where(RoomNight.room == 7).tuples())
+            self.assertEqual(nights[date(2026, 1, 3)], first.id)
+            self.assertEqual(nights[date(2026, 1, 5)], overlapping.id)
+            # Повторная пересборка даёт тот же реестр
+            self.assertEqual(rebuild_room_nights([7]), result)
+        self.assertNotIn(7, [room['id'] for room in self.client.get('/rooms/search/available_rooms', params=params).json()])
+
+    def test_71_rebuild_command(self):
+        """Тест: команда rebuild пересобирает реестр всех номеров"""
+        import reservations
+        from models import RoomNight
+
+        with self.db.connection_context():
+            RoomNight.delete().execute()
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            result = reservations.main(['rebuild'])
+        self.assertIn('Rebuilt', stdout.getvalue())
+        with self.db.connection_context():
+            self.assertEqual(RoomNight.select().count(), result['nights'])
+        self.assertGreaterEqual(result['nights'], self.ROWS * 4)
+        self.assertEqual(self.client.get('/rooms/search/available_rooms',
+                                         params={'check_in': '2024-03-02', 'check_out': '2024-03-03'}).json(), [])
+
+class TestGuestSearch(ApiTestCase):
+    """Тесты поиска гостей по префиксу"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from models import Guest
+        with cls.db.connection_context():
+            Guest.create(first_name='Анна', last_name='Смирнова', email='anna@hotel.ru', phone='+74951112233')
+            Guest.create(first_name='Андрей', last_name='Анисимов', email='andrey@hotel.ru', phone='+74951114455')
+            Guest.create(first_name='Ольга', last_name='Андреева', email='olga_a@hotel.ru', phone='+78120000000')
+
+    def search(self, q, **params):
+        response = self.client.get('/guests/search', params=dict(params, q=q))
+        self.assertEqual(response.status_code, 200)
+        return [(guest['first_name'], guest['last_name']) for guest in response.json()]
+
+    def test_72_prefix_search_by_field(self):
+        """Тест: имя и фамилия, email, телефон и «имя фамилия»"""
+        self.assertEqual(self.search('Анд'), [('Андрей', 'Анисимов'), ('Ольга', 'Андреева')])
+        self.assertEqual(self.search('Анд', limit=1), [('Андрей', 'Анисимов')])
+        self.assertEqual(self.search('anna@'), [('Анна', 'Смирнова')])
+        self.assertEqual(self.search('+7495111'), [('Анна', 'Смирнова'), ('Андрей', 'Анисимов')])
+        self.assertEqual(self.search('Ольга  Анд'), [('Ольга', 'Андреева')])
+        self.assertEqual(self.search('Андреева Ол'), [('Ольга', 'Андреева')])
+        # Спецсимволы LIKE ищутся как обычные символы
+        self.assertEqual(self.search('olga_'), [('Ольга', 'Андреева')])
+        self.assertEqual(self.search('%'), [])
+        self.assertEqual(self.client.get('/guests/search').status_code, 422)
+
+    def test_73_search_uses_field_indexes(self):
+        """Тест: каждое поле ищется по своему индексу, запросов не больше числа полей"""
+        import migrations
+        self.assertQueryBudget('/guests/search?q=Анд', 3)
+        self.assertQueryBudget('/guests/search?q=%2B7495', 1)
+        with self.db.connection_context():
+            for column in ('first_name', 'last_name', 'email', 'phone'):
+                self.assertTrue(migrations.index_exists('guest', f'guest_{column}'), column)
+
+class TestHotelSearch(ApiTestCase):
+    """Тесты поиска отелей с фасетами"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from models import Hotel, Room
+        with cls.db.connection_context():
+            kazan = Hotel.create(name='Казанский', address='ул. Баумана', city='Казань', rating=3.2)
+            sochi = Hotel.create(name='Морской', address='ул. Приморская', city='Сочи', rating=4.9)
+            cls.empty_hotel = Hotel.create(name='Пустой', address='ул. Новая', city='Сочи', rating=2.0).id
+            for hotel, price, available in ((kazan, 3000, 1), (kazan, 9000, 1), (sochi, 12000, 1), (sochi, 1000, 0)):
+                Room.create(hotel=hotel, room_type=1, room_number='1', price_per_night=price, is_available=available)
+        clear_caches()
+
+    def search(self, **params):
+        response = self.client.get('/hotels/search', params=params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_74_filters_and_facets(self):
+        """Тест: фильтры по городу, рейтингу и цене; фасеты без учёта своего фильтра"""
+        result = self.search(city='Сочи')
+        self.assertEqual(result['total'], 2)
+        self.assertEqual([hotel['name'] for hotel in result['hotels']], ['Морской', 'Пустой'])
+        self.assertEqual(result['facets']['city'], {'Москва': self.ROWS, 'Казань': 1, 'Сочи': 2})
+        self.assertEqual(result['facets']['rating'], {'0-1': 0, '1-2': 0, '2-3': 1, '3-4': 0, '4-5': 1})
+
+        # Недоступный номер за 1000 не учитывается
+        result = self.search(min_price=500, max_price=4000)
+        self.assertEqual([(hotel['city'], hotel['min_price']) for hotel in result['hotels']], [('Казань', 3000.0)])
+        self.assertEqual(result['facets']['city'], {'Казань': 1})
+
+        result = self.search(min_rating=4, max_price=10000)
+        self.assertEqual(result['total'], self.ROWS)
+        self.assertEqual(result['facets']['rating']['3-4'], 1)
+
+    def test_75_sort_paging_and_refresh(self):
+        """Тест: сортировка, страницы и перестроение индекса в фоне после записи номера"""
+        import time
+        from hotel_search import HotelIndex
+        load = HotelIndex.load
+        result = self.search(sort='-rating', limit=1)
+        self.assertEqual([hotel['name'] for hotel in result['hotels']], ['Морской'])
+        by_price = self.search(sort='price', limit=100)['hotels']
+        self.assertEqual(by_price[0]['min_price'], 3000.0)
+        self.assertEqual(by_price[-1]['id'], self.empty_hotel)
+        self.assertIsNone(by_price[-1]['min_price'])
+        self.assertEqual(self.search(sort='price', offset=1, limit=1)['hotels'][0]['id'], by_price[1]['id'])
+        self.assertEqual(self.client.get('/hotels/search', params={'sort': 'name'}).status_code, 400)
+
+        response = self.client.post('/rooms/bulk', json=[{'hotel_id': self.empty_hotel, 'room_type_id': 1,
+                                                          'room_number': 1, 'price_per_night': 100,
+                                                          'is_available': 1}])
+        self.assertEqual(response.status_code, 200)
+        # Пока новый снимок строится в фоне, поиск отвечает по старому
+        from hotel_search import hotel_search
+        with patch('hotel_search.HotelIndex.load', side_effect=lambda: time.sleep(0.2) or load()):
+            self.assertEqual(self.search(sort='price', limit=1)['hotels'][0]['id'], by_price[0]['id'])
+            self.assertTrue(hotel_search.stats()['rebuilding'])
+            hotel_search.wait()
+        self.assertEqual(self.search(sort='price', limit=1)['hotels'][0]['id'], self.empty_hotel)
+
+class TestCascadeDelete(ApiTestCase):
+    """Тесты каскадного удаления пачками"""
+
+    def make_hotel(self, rooms=3, bookings_per_room=2):
+        hotel_id = self.client.post('/hotels/', json={'name': 'Под снос', 'address': 'ул. Старая',
+                                                      'city': 'Тверь', 'rating': 3.0}).json()['id']
+        room_ids = self.client.post('/rooms/bulk', json=[{'hotel_id': hotel_id, 'room_type_id': 1,
+                                                          'room_number': number, 'price_per_night': 1000,
+                                                          'is_available': 1} for number in range(rooms)]).json()['ids']
+        response = self.client.post('/bookings/bulk', json=[{
+            'guest_id': 1, 'room_id': room_id, 'check_in_date': f'2027-0{index + 1}-01',
+            'check_out_date': f'2027-0{index + 1}-03', 'status': 'confirmed'
+        } for room_id in room_ids for index in range(bookings_per_room)])
+        self.assertEqual(response.status_code, 200)
+        return hotel_id, room_ids
+
+    def test_76_dry_run_and_chunked_delete(self):
+        """Тест: dry_run считает строки, удаление идёт пачками и сбрасывает кэши"""
+        import cascade
+        from models import Hotel, Booking, RoomNight
+
+        hotel_id, room_ids = self.make_hotel()
+        expected = {'room_night': 12, 'booking': 6, 'room': 3, 'hotel': 1}
+        self.assertEqual(self.client.delete(f'/hotels/{hotel_id}', params={'dry_run': True}).json(),
+                         {'dry_run': True, 'counts': expected})
+        self.assertEqual(self.client.get(f'/hotels/{hotel_id}').status_code, 200)
+        self.assertEqual(self.client.get('/hotels/search', params={'city': 'Тверь'}).json()['total'], 1)
+
+        response = self.client.delete(f'/hotels/{hotel_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['deleted'], expected)
+        self.assertEqual(self.client.get(f'/hotels/{hotel_id}').status_code, 404)
+        # Удалённый отель пропадает из страницы сразу, из индекса — после перестроения в фоне
+        from hotel_search import hotel_search
+        self.assertEqual(self.client.get('/hotels/search', params={'city': 'Тверь'}).json()['hotels'], [])
+        hotel_search.wait()
+        self.assertEqual(self.client.get('/hotels/search', params={'city': 'Тверь'}).json()['total'], 0)
+        with self.db.connection_context():
+            self.assertFalse(Booking.select().where(Booking.room.in_(room_ids)).exists())
+            self.assertFalse(RoomNight.select().where(RoomNight.room.in_(room_ids)).exists())
+        self.assertEqual(self.client.delete(f'/hotels/{hotel_id}').status_code, 404)
+
+        # Пачки по 4 строки: брони 4 + 2, затем номера 3
+        hotel_id, room_ids = self.make_hotel()
+        progress = []
+        with self.db.connection_context(), patch.object(cascade, 'CASCADE_BATCH_SIZE', 4):
+            deleted = cascade.Cascade(Hotel, hotel_id).run(progress.append)
+        self.assertEqual(deleted, expected)
+        self.assertEqual([(step['booking'], step['room']) for step in progress], [(4, 0), (6, 0), (6, 3)])
+
+    def test_77_background_delete_job(self):
+        """Тест: удаление гостя в фоне, статус и результат через /jobs/{id}"""
+        import time
+        guest_id = self.client.post('/guests/', json={'first_name': 'Пётр', 'last_name': 'Уехавший',
+                                                      'email': 'gone@mail.ru', 'phone': '+79990000000'}).json()['id']
+        self.client.post('/bookings/', json={'guest_id': guest_id, 'room_id': 2, 'check_in_date': '2028-01-01',
+                                             'check_out_date': '2028-01-04', 'status': 'confirmed'})
+
+        response = self.client.delete(f'/guests/{guest_id}', params={'background': True})
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        deadline = time.monotonic() + 10
+        while True:
+            job = self.client.get(status_url).json()
+            if job['status'] in ('done', 'failed') or time.monotonic() > deadline:
+                break
+            time.sleep(0.01)
+        self.assertEqual(job['status'], 'done', job)
+        self.assertEqual(job['result'], {'room_night': 3, 'booking': 1, 'guest': 1})
+        self.assertEqual(self.client.get(f'/guests/{guest_id}').status_code, 404)
+        self.assertEqual(self.client.get('/jobs/unknown').status_code, 404)
+
+class TestMultiGet(ApiTestCase):
+    """Тесты получения записей списком id"""
+
+    def test_78_ids_in_request_order_with_nulls(self):
+        """Тест: записи в порядке ids, null на месте отсутствующих, IN пачками"""
+        for resource in ('hotels', 'room_types', 'rooms', 'guests', 'bookings'):
+            rows = self.client.get(f'/{resource}/', params={'ids': '1,999999,1'}).json()
+            self.assertEqual(len(rows), 3, resource)
+            self.assertEqual(rows[0]['id'], 1, resource)
+            self.assertIsNone(rows[1], resource)
+            self.assertEqual(rows[2], rows[0], resource)
+
+        rows = self.client.get('/guests/', params={'ids': '3,1,2'}).json()
+        self.assertEqual([row['email'] for row in rows], ['g2@mail.ru', 'g0@mail.ru', 'g1@mail.ru'])
+        self.assertEqual(self.client.get('/bookings/', params={'ids': ''}).json(), [])
+
+        ids = ','.join(str(object_id) for object_id in range(1, 2501))
+        rows = self.assertQueryBudget(f'/rooms/?ids={ids}', 3).json()
+        self.assertEqual(len(rows), 2500)
+        self.assertEqual(sum(row is not None for row in rows), self.ROWS)
+
+        self.assertEqual(self.client.get('/rooms/', params={'ids': '1,x'}).status_code, 400)
+        too_many = ','.join(['1'] * 5001)
+        self.assertEqual(self.client.get(f'/rooms/?ids={too_many}').status_code, 413)
+
+    def test_79_async_ids(self):
+        """Тест: асинхронные эндпоинты поддерживают ids так же"""
+        with self.client:
+            for resource in ('hotels', 'rooms', 'guests', 'bookings'):
+                rows = self.client.get(f'/async/{resource}/', params={'ids': '2,999999,1'}).json()
+                self.assertEqual([row and row['id'] for row in rows], [2, None, 1], resource)
+            sync_rows = self.client.get('/bookings/', params={'ids': '2,1'}).json()
+            self.assertEqual(self.client.get('/async/bookings/', params={'ids': '2,1'}).json(), sync_rows)
+
+class TestSparseFieldsets(ApiTestCase):
+    """Тесты выбора полей ответа"""
+
+    def test_80_fields_limit_columns_and_keys(self):
+        """Тест: в ответе и в SELECT только запрошенные поля и id"""
+        from serializers import booking_serializer, FieldsParams
+
+        response = self.client.get('/bookings/', params={'fields': 'status', 'limit': 2})
+        self.assertEqual(response.json(), [{'id': 1, 'status': 'confirmed'}, {'id': 2, 'status': 'confirmed'}])
+        self.assertEqual(response.headers['X-Next-Cursor'], '2')
+
+        hotels = self.client.get('/hotels/', params={'fields': 'name,city,name', 'limit': 1}).json()
+        self.assertEqual(list(hotels[0]), ['id', 'name', 'city'])
+        rows = self.client.get('/hotels/', params={'fields': 'city', 'ids': '2,999999'}).json()
+        self.assertEqual(rows, [{'id': 2, 'city': 'Москва'}, None])
+        self.assertEqual(self.client.get('/rooms/1', params={'fields': 'price_per_night'}).json(),
+                         {'id': 1, 'price_per_night': 5000})
+        self.assertEqual(self.client.get('/room_types/1', params={'fields': 'capacity'}).json(),
+                         {'id': 1, 'capacity': 2})
+
+        sql, _ = booking_serializer.select(booking_serializer.only(FieldsParams('status'))).sql()
+        self.assertNotIn('total_price', sql)
+        self.assertNotIn('check_in_date', sql)
+
+    def test_81_unknown_field_and_async(self):
+        """Тест: неизвестное поле — 400; асинхронные эндпоинты выбирают поля так же"""
+        response = self.client.get('/guests/', params={'fields': 'email,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail']['fields'], ['password'])
+        self.assertEqual(self.client.get('/bookings/1', params={'fields': 'total'}).status_code, 400)
+        with self.client:
+            rows = self.client.get('/async/guests/', params={'fields': 'email', 'limit': 1}).json()
+            self.assertEqual(rows, [{'id': 1, 'email': 'g0@mail.ru'}])
+            rows = self.client.get('/async/rooms/', params={'fields': 'hotel_id', 'ids': '3'}).json()
+            self.assertEqual(rows, [{'id': 3, 'hotel_id': 3}])
+            for url in ['/async/hotels/1', '/async/room_types/1', '/async/rooms/1', '/async/guests/1',
+                        '/async/bookings/1']:
+                self.assertEqual(self.client.get(url, params={'fields': 'nope'}).status_code, 400)
+            row = self.client.get('/async/rooms/1', params={'fields': 'price_per_night'}).json()
+            self.assertEqual(row, self.client.get('/rooms/1', params={'fields': 'price_per_night'}).json())
+            self.assertEqual(set(row), {'id', 'price_per_night'})
+            row = self.client.get('/async/hotels/2', params={'fields': 'city'}).json()
+            self.assertEqual(row, self.client.get('/hotels/2', params={'fields': 'city'}).json())
+
+class TestIdempotency(ApiTestCase):
+    """Тесты повторов POST с заголовком Idempotency-Key"""
+
+    def setUp(self):
+        from idempotency import idempotency_store
+        idempotency_store.clear()
+
+    def booking(self, **changes):
+        return dict({'guest_id': 1, 'room_id': 8, 'check_in_date': '2029-01-01',
+                     'check_out_date': '2029-01-03', 'status': 'confirmed'}, **changes)
+
+    def count_bookings(self):
+        from models import Booking
+        with self.db.connection_context():
+            return Booking.select().count()
+
+    def test_82_replay_returns_stored_response(self):
+        """Тест: повтор с тем же ключом не создаёт бронь и отдаёт первый ответ"""
+        import metrics
+        metrics.requests_total.clear()
+        before = self.count_bookings()
+        headers = {'Idempotency-Key': 'retry-1'}
+        first = self.client.post('/bookings/', json=self.booking(), headers=headers)
+        self.assertEqual(first.status_code, 200)
+        replay = self.client.post('/bookings/', json=self.booking(), headers=headers)
+        self.assertEqual(replay.status_code, 200)
+        # Повтор считается в метриках по маршруту первого запроса, а не как unmatched
+        text = self.client.get('/metrics').text
+        self.assertIn('http_requests_total{method="POST",route="/bookings/",status="200"} 2', text)
+        self.assertNotIn('route="unmatched"', text)
+
+        # Ответ без маршрута не сохраняется, путь от клиента в метки не попадает
+        from idempotency import idempotency_store
+        from cache import MISSING
+        for _ in range(2):
+            response = self.client.post('/nope/1', json={}, headers={'Idempotency-Key': 'unmatched'})
+            self.assertEqual(response.status_code, 404)
+            self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertIs(idempotency_store.get(('/nope/1', b'unmatched')), MISSING)
+        text = self.client.get('/metrics').text
+        self.assertIn('http_requests_total{method="POST",route="unmatched",status="404"} 2', text)
+        self.assertNotIn('/nope/', text)
+        self.assertEqual(replay.json(), first.json())
+        self.assertEqual(replay.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(replay.headers['X-DB-Queries'], '0')
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        self.assertEqual(self.count_bookings(), before + 1)
+
+        # Тот же ключ с другим телом — ошибка клиента
+        changed = self.client.post('/bookings/', json=self.booking(room_id=9), headers=headers)
+        self.assertEqual(changed.status_code, 422)
+        # Ключ действует в пределах пути
+        hotel = {'name': 'Новый', 'address': 'ул. Новая', 'city': 'Тула', 'rating': 4.0}
+        self.assertEqual(self.client.post('/hotels/', json=hotel, headers=headers).status_code, 200)
+        self.assertEqual(self.count_bookings(), before + 1)
+
+    def test_83_in_flight_errors_and_expiry(self):
+        """Тест: повтор во время выполнения — 409; 5xx и истёкшие ключи не воспроизводятся"""
+        import asyncio
+        from idempotency import IdempotencyMiddleware
+        from cache import LRUCache
+
+        calls = []
+
+        async def app(scope, receive, send):
+            # Как роутер: найденный маршрут записывается в scope
+            scope['route'] = MagicMock(path='/bookings/')
+            calls.append((await receive())['body'])
+            status = 500 if b'fail' in calls[-1] else 201
+            await send({'type': 'http.response.start', 'status': status, 'headers': []})
+            await send({'type': 'http.response.body', 'body': b'ok'})
+
+        def call(middleware, key, body):
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {'type': 'http', 'method': 'POST', 'path': '/bookings/', 'headers': [(b'idempotency-key', key)]}
+            asyncio.run(middleware(scope, receive, send))
+            return sent[0]['status']
+
+        store = LRUCache(ttl=60)
+        middleware = IdempotencyMiddleware(app, store)
+        middleware.in_flight[('/bookings/', b'busy')] = {}
+        self.assertEqual(call(middleware, b'busy', b'{}'), 409)
+        self.assertEqual(calls, [])
+
+        self.assertEqual(call(middleware, b'failing', b'fail'), 500)
+        self.assertEqual(call(middleware, b'failing', b'fail'), 500)
+        self.assertEqual(len(calls), 2)
+
+        self.assertEqual(call(middleware, b'k', b'{}'), 201)
+        self.assertEqual(call(middleware, b'k', b'{}'), 201)
+        self.assertEqual(len(calls), 3)
+        # Истёкшая запись не воспроизводится
+        store.ttl = 0
+        store.set(('/bookings/', b'k'), store.get(('/bookings/', b'k')))
+        self.assertEqual(call(middleware, b'k', b'{}'), 201)
+        self.assertEqual(len(calls), 4)
+
+        # Без ключа повторы выполняются как обычно
+        before = self.count_bookings()
+        self.client.post('/bookings/', json=self.booking(room_id=10))
+        self.client.post('/bookings/', json=self.booking(room_id=10, check_in_date='2029-02-01',
+                                                         check_out_date='2029-02-02'))
+        self.assertEqual(self.count_bookings(), before + 2)
+        self.assertIn('idempotency', self.client.get('/stats/cache').json())
+
 def run_unit_tests():
     """Запуск unit тестов"""
     print("UNIT ТЕСТЫ\n")
@@ -669,7 +1885,31 @@ def run_unit_tests():
         TestSearchFunctionality,
         TestUpdateOperations,
         TestDeleteOperations,
-        TestAdditionalScenarios
+        TestAdditionalScenarios,
+        TestQueryBudget,
+        TestAvailabilitySearch,
+        TestConnectionPool,
+        TestAsyncEndpoints,
+        TestBulkCreate,
+        TestImporter,
+        TestReferenceCache,
+        TestConditionalGet,
+        TestOverbooking,
+        TestPricing,
+        TestMigrations,
+        TestFastStartup,
+        TestSerializers,
+        TestBenchmark,
+        TestQueryStats,
+        TestMetrics,
+        TestAnalytics,
+        TestRoomNightLedger,
+        TestGuestSearch,
+        TestHotelSearch,
+        TestCascadeDelete,
+        TestMultiGet,
+        TestSparseFieldsets,
+        TestIdempotency
     ]
     
     for test_class in test_classes: